@@ -0,0 +1,132 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import numpy as np
+
+
+class AnalyticsWorker:
+    """
+    Run heatmap accumulation, time statistics and dashboard rendering on a
+    separate thread. The frame path submits the detections of every frame
+    and composites the newest finished dashboard image without waiting.
+    """
+
+    # Frames of detections kept while the worker is busy. When it falls
+    # further behind the oldest ones are dropped.
+    MAX_PENDING = 64
+
+    def __init__(self, dashboard, heatmap, timecount):
+        """
+        Args:
+            dashboard: Dashboard rendered by this worker
+            heatmap: HeatMap accumulated by this worker
+            timecount: ObjectTimeCount updated on the frame path
+        """
+        self.dashBoard = dashboard
+        self.heatMap = heatmap
+        self.timeCount = timecount
+
+        self.cond = threading.Condition()
+        self.pending = []  # detections not yet added to the heatmap
+        self.frame = None  # copy of a frame for the heatmap background
+        self.frame_wanted = True
+        self.stop_thread = False
+
+        # Newest finished dashboard. It is never written again once
+        # published, so the frame path can read it without locking.
+        self.dashboard = self.dashBoard.dashboard.copy()
+
+        self.worker_thread = threading.Thread(target=self.run, daemon=True)
+        self.worker_thread.start()
+
+    def submit(self, detections, frame):
+        """
+        Hand the detections of a frame to the worker. Called on the frame
+        path before any overlay is drawn on the frame.
+        Args:
+            detections: (M, 2, 2) boxes of this frame
+            frame: current frame, copied only when the worker needs one
+        Returns:
+            number of frames of detections dropped to make room
+        """
+        dropped = 0
+        with self.cond:
+            if self.stop_thread:
+                return dropped
+            if len(self.pending) >= AnalyticsWorker.MAX_PENDING:
+                dropped = len(self.pending) - AnalyticsWorker.MAX_PENDING + 1
+                del self.pending[:dropped]
+            self.pending.append(detections)
+            if self.frame_wanted:
+                self.frame = frame.copy()
+                self.frame_wanted = False
+            self.cond.notify()
+        return dropped
+
+    def stop(self):
+        """
+        Stop the worker thread and wait for it to exit
+        """
+        with self.cond:
+            self.stop_thread = True
+            self.pending = []
+            self.frame = None
+            self.cond.notify()
+        if self.worker_thread is not threading.current_thread():
+            self.worker_thread.join()
+
+    def run(self):
+        """
+        Callback function for the worker thread
+        """
+        while True:
+            with self.cond:
+                while not self.pending and not self.stop_thread:
+                    self.cond.wait()
+                if self.stop_thread:
+                    break
+                pending, self.pending = self.pending, []
+                frame, self.frame = self.frame, None
+
+            # all the boxes since the last pass are added in one batch
+            self.heatMap.update(np.concatenate(pending).reshape(-1, 2, 2))
+
+            changed = self.dashBoard.update_tickets()
+            if self.dashBoard.refresh_due():
+                if frame is None:
+                    with self.cond:
+                        self.frame_wanted = True
+                else:
+                    self.dashBoard.update_plots(frame)
+                    changed = True
+
+            if changed:
+                self.dashboard = self.dashBoard.dashboard.copy()
@@ -30,6 +30,12 @@
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import sys
+import startup_profile
+
+# enabled before the other imports so that they are timed as well
+if "--profile-startup" in sys.argv:
+    startup_profile.enable()
+
 import yaml
 
 from edge_ai_class import EdgeAIDemo
@@ -39,11 +45,17 @@ import utils
 def main(sys_argv):
     args = utils.get_cmdline_args(sys_argv)
 
-    with open(args.config, "r") as f:
-        config = yaml.safe_load(f)
+    with startup_profile.phase("load config"):
+        with open(args.config, "r") as f:
+            config = yaml.safe_load(f)
 
     try:
         demo = EdgeAIDemo(config)
+
+        if args.profile_startup:
+            startup_profile.disable()
+            startup_profile.report()
+
         demo.start()
 
         if args.verbose:
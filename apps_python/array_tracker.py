@@ -0,0 +1,291 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+
+class TrackedBox:
+    """
+    View of one active track. Exposes the same id and estimate attributes
+    as norfair's TrackedObject.
+    """
+
+    __slots__ = ("id", "estimate")
+
+    def __init__(self, id, estimate):
+        self.id = id
+        self.estimate = estimate
+
+
+class ArrayTracker:
+    """
+    IoU tracker which keeps the state of all tracks in contiguous arrays
+    instead of one Python object per track. The hit counter, initialization
+    and id semantics follow norfair.Tracker, and every box corner has the same
+    constant velocity Kalman filter as norfair's OptimizedKalmanFilter, so the
+    two trackers can be swapped without changing the analytics.
+    """
+
+    # Kalman filter parameters, same defaults as norfair
+    KALMAN_R = 4.0
+    KALMAN_Q = 0.1
+    POS_VARIANCE = 10.0
+    VEL_VARIANCE = 1.0
+
+    def __init__(
+        self,
+        initialization_delay=4,
+        distance_threshold=1,
+        hit_counter_max=5,
+        matching="greedy",
+        capacity=64,
+    ):
+        """
+        Args:
+            initialization_delay: Hits needed before a track gets an id
+            distance_threshold: Maximum 1 - IoU distance for a match
+            hit_counter_max: Maximum value of the hit counter
+            matching: "greedy" or "hungarian" assignment
+            capacity: Initial number of track slots, grown on demand
+        """
+        if matching not in ("greedy", "hungarian"):
+            raise ValueError("Unknown tracker matching '%s'" % matching)
+
+        self.initialization_delay = initialization_delay
+        self.distance_threshold = distance_threshold
+        self.hit_counter_max = hit_counter_max
+        self.matching = matching
+
+        self.count = 0  # number of tracks in use
+        self.id_count = 0  # number of ids handed out
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """
+        (Re)allocate the track arrays keeping the tracks in use
+        Args:
+            capacity: new number of track slots
+        """
+        n = self.count
+        arrays = {
+            "x": np.zeros((capacity, 4)),  # box [X1 Y1 X2 Y2]
+            "v": np.zeros((capacity, 4)),  # velocity of each co-ordinate
+            "pos_var": np.zeros((capacity, 4)),
+            "pos_vel_cov": np.zeros((capacity, 4)),
+            "vel_var": np.zeros((capacity, 4)),
+            "hit": np.zeros(capacity, np.int32),
+            "ids": np.zeros(capacity, np.int64),  # 0 while initializing
+        }
+        for name, array in arrays.items():
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def update(self, boxes=None, period=1):
+        """
+        Advance all tracks by one frame and match them with the detections
+        Args:
+            boxes: (M, 2, 2) or (M, 4) detected boxes in pixels, or None
+            period: frames since the previous detections
+        Returns:
+            list of TrackedBox for the active tracks
+        """
+        # Remove dead tracks, keeping the arrays contiguous
+        n = self.count
+        keep = self.hit[:n] >= 0
+        if not keep.all():
+            m = int(keep.sum())
+            for array in (self.x, self.v, self.pos_var, self.pos_vel_cov,
+                          self.vel_var, self.hit, self.ids):
+                array[:m] = array[:n][keep]
+            n = self.count = m
+
+        # Predict
+        self.hit[:n] -= 1
+        self.x[:n] += self.v[:n]
+
+        if boxes is None:
+            boxes = np.zeros((0, 4))
+        boxes = np.asarray(boxes, np.float64).reshape(-1, 4)
+
+        if len(boxes) and n:
+            distances = 1 - self.iou(boxes, self.x[:n])
+
+            # Initialized tracks get the first pick of the detections
+            initialized = self.ids[:n] > 0
+            det_idx, trk_idx = self.assign(distances, initialized)
+            unmatched = np.ones(len(boxes), bool)
+            unmatched[det_idx] = False
+
+            det_idx2, trk_idx2 = self.assign(distances, ~initialized, unmatched)
+            unmatched[det_idx2] = False
+
+            det_idx = np.concatenate([det_idx, det_idx2])
+            trk_idx = np.concatenate([trk_idx, trk_idx2])
+            self.hit_tracks(trk_idx, boxes[det_idx], period)
+            boxes = boxes[unmatched]
+
+        self.add_tracks(boxes, period)
+
+        return self.get_active_objects()
+
+    def assign(self, distances, track_mask, det_mask=None):
+        """
+        Match detections with a subset of the tracks
+        Args:
+            distances: (M, N) 1 - IoU between detections and tracks
+            track_mask: (N,) tracks which may be matched
+            det_mask: (M,) detections which may be matched
+        Returns:
+            Index arrays of the matched detections and tracks
+        """
+        det_sel = np.arange(distances.shape[0])
+        if det_mask is not None:
+            det_sel = det_sel[det_mask]
+        trk_sel = np.flatnonzero(track_mask)
+        empty = np.zeros(0, np.intp)
+        if len(det_sel) == 0 or len(trk_sel) == 0:
+            return empty, empty
+
+        sub = distances[np.ix_(det_sel, trk_sel)]
+        if self.matching == "hungarian":
+            from scipy.optimize import linear_sum_assignment
+
+            cost = np.where(sub < self.distance_threshold, sub, sub.max() + 1e6)
+            rows, cols = linear_sum_assignment(cost)
+            valid = sub[rows, cols] < self.distance_threshold
+            rows, cols = rows[valid], cols[valid]
+        else:
+            # Greedy by increasing distance, the same order as norfair
+            rows, cols = np.nonzero(sub < self.distance_threshold)
+            order = np.argsort(sub[rows, cols], kind="stable")
+            used_rows = np.zeros(sub.shape[0], bool)
+            used_cols = np.zeros(sub.shape[1], bool)
+            keep = []
+            for k in order:
+                r, c = rows[k], cols[k]
+                if not used_rows[r] and not used_cols[c]:
+                    used_rows[r] = used_cols[c] = True
+                    keep.append(k)
+            rows, cols = rows[keep], cols[keep]
+
+        return det_sel[rows], trk_sel[cols]
+
+    def hit_tracks(self, idx, boxes, period):
+        """
+        Update matched tracks with their detections
+        Args:
+            idx: indices of the matched tracks
+            boxes: (K, 4) matched boxes
+            period: frames since the previous detections
+        """
+        if len(idx) == 0:
+            return
+        self.hit[idx] = np.minimum(self.hit[idx] + 2 * period, self.hit_counter_max)
+
+        # Kalman update, see norfair.filter.OptimizedKalmanFilter
+        pos_var = self.pos_var[idx]
+        pos_vel_cov = self.pos_vel_cov[idx]
+        vel_var = self.vel_var[idx]
+        error = boxes - self.x[idx]
+        vel_plus_cov = pos_vel_cov + vel_var
+        added = pos_var + pos_vel_cov + vel_plus_cov + self.KALMAN_Q + self.KALMAN_R
+        r_over_added = self.KALMAN_R / added
+        vel_over_added = vel_plus_cov / added
+
+        self.x[idx] += (1 - r_over_added) * error
+        self.v[idx] += vel_over_added * error
+        self.pos_var[idx] = (1 - r_over_added) * self.KALMAN_R
+        self.pos_vel_cov[idx] = vel_over_added * self.KALMAN_R
+        self.vel_var[idx] = vel_var + self.KALMAN_Q - np.square(vel_over_added) * added
+
+        # Tracks which are hit often enough get an id
+        new = idx[(self.ids[idx] == 0) & (self.hit[idx] > self.initialization_delay)]
+        if len(new):
+            self.ids[new] = np.arange(self.id_count + 1, self.id_count + 1 + len(new))
+            self.id_count += len(new)
+
+    def add_tracks(self, boxes, period):
+        """
+        Start new tracks from unmatched detections
+        Args:
+            boxes: (K, 4) unmatched boxes
+            period: frames since the previous detections
+        """
+        k = len(boxes)
+        if k == 0:
+            return
+        n = self.count
+        if n + k > self.capacity:
+            self.allocate(max(2 * self.capacity, n + k))
+
+        new = slice(n, n + k)
+        self.x[new] = boxes
+        self.v[new] = 0
+        self.pos_var[new] = self.POS_VARIANCE
+        self.pos_vel_cov[new] = 0
+        self.vel_var[new] = self.VEL_VARIANCE
+        self.hit[new] = period
+        self.ids[new] = 0
+        if period > self.initialization_delay:
+            self.ids[new] = np.arange(self.id_count + 1, self.id_count + 1 + k)
+            self.id_count += k
+        self.count = n + k
+
+    def get_active_objects(self):
+        """
+        Get the initialized tracks whose hit counter is not negative
+        """
+        n = self.count
+        active = np.flatnonzero((self.ids[:n] > 0) & (self.hit[:n] >= 0))
+        estimates = self.x[active].reshape(-1, 2, 2)
+        return [
+            TrackedBox(int(track_id), estimate)
+            for track_id, estimate in zip(self.ids[active], estimates)
+        ]
+
+    @staticmethod
+    def iou(boxes1, boxes2):
+        """
+        IoU of every box in boxes1 with every box in boxes2
+        Args:
+            boxes1: (M, 4) boxes as [X1 Y1 X2 Y2]
+            boxes2: (N, 4) boxes as [X1 Y1 X2 Y2]
+        Returns:
+            (M, N) IoU matrix
+        """
+        area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+        area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+        top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+        bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+        intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+        union = area1[:, None] + area2[None, :] - intersection
+        return intersection / np.maximum(union, 1e-9)
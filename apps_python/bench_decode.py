@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Microbenchmark of the detection decode in PostProcessTracking.
+
+Compares the vectorized decode path against the original per-row loop for
+10, 100 and 500 raw detections. Run from apps_python:
+
+    python3 bench_decode.py
+"""
+
+import sys
+import timeit
+import argparse
+import numpy as np
+from types import SimpleNamespace
+from norfair import Detection
+
+from post_process import PostProcessTracking
+
+
+def legacy_decode(model, results_bbox, width, height):
+    """
+    Original per-row decode, kept here as the reference implementation
+    """
+    if not model.normalized_detections:
+        results_bbox[..., (0, 2)] /= model.resize[0]
+        results_bbox[..., (1, 3)] /= model.resize[1]
+    results_bbox[..., (0, 2)] *= width
+    results_bbox[..., (1, 3)] *= height
+
+    norfair_detections = []
+    for b in results_bbox:
+        if b[5] > model.viz_threshold and int(b[4]) == 0:
+            bbox = np.array(
+                [
+                    [b[0].item(), b[1].item()],
+                    [b[2].item(), b[3].item()],
+                ]
+            )
+            scores = np.array([b[5], b[5]])
+            norfair_detections.append(
+                Detection(points=bbox, scores=scores, label=int(b[4]))
+            )
+    return norfair_detections
+
+
+def make_raw_detections(num, resize, rng):
+    """
+    Create a (num, 6) matrix that looks like a yolox output in model space
+    """
+    xy1 = rng.uniform(0, 0.8, (num, 2)) * resize
+    wh = rng.uniform(0.02, 0.2, (num, 2)) * resize
+    classes = rng.choice([0, 0, 0, 2, 56], num)
+    scores = rng.uniform(0, 1, num)
+    return np.column_stack([xy1, xy1 + wh, classes, scores]).astype(np.float32)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--repeat", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args(argv[1:])
+
+    model = SimpleNamespace(
+        viz_threshold=0.6, normalized_detections=False, resize=[640, 640]
+    )
+    post_proc = PostProcessTracking.__new__(PostProcessTracking)
+    post_proc.model = model
+    width, height = 1280, 720
+    rng = np.random.default_rng(0)
+
+    print("%8s %14s %14s %14s %8s" % ("raw", "loop [us]", "vector [us]", "decode [us]", "speedup"))
+    for num in args.sizes:
+        raw = make_raw_detections(num, np.array(model.resize), rng)
+
+        def run_legacy():
+            legacy_decode(model, raw.copy(), width, height)
+
+        def run_vector():
+            boxes, scores = post_proc.decode_detections(raw, width, height)
+            post_proc.yolo_detections_to_norfair_detections(boxes, scores)
+
+        def run_decode():
+            post_proc.decode_detections(raw, width, height)
+
+        # both paths must hand the tracker the same detections
+        ref = legacy_decode(model, raw.copy(), width, height)
+        boxes, scores = post_proc.decode_detections(raw, width, height)
+        out = post_proc.yolo_detections_to_norfair_detections(boxes, scores)
+        assert len(ref) == len(out)
+        for a, b in zip(ref, out):
+            assert np.allclose(a.points, b.points, rtol=1e-4)
+
+        t_legacy = min(timeit.repeat(run_legacy, number=args.repeat, repeat=3))
+        t_vector = min(timeit.repeat(run_vector, number=args.repeat, repeat=3))
+        t_decode = min(timeit.repeat(run_decode, number=args.repeat, repeat=3))
+        t_legacy, t_vector, t_decode = [
+            t * 1e6 / args.repeat for t in (t_legacy, t_vector, t_decode)
+        ]
+        print(
+            "%8d %14.1f %14.1f %14.1f %7.1fx"
+            % (num, t_legacy, t_vector, t_decode, t_legacy / t_vector)
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
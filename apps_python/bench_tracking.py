@@ -0,0 +1,365 @@
+#!/usr/bin/python3
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Scalability benchmark of the people tracking post process.
+
+Generates deterministic synthetic pedestrians and drives the detection
+decode, tracker, ObjectTimeCount, HeatMap, PathDraw and Dashboard stages of
+PostProcessTracking without GStreamer or a DSP. For every crowd size it
+reports per-frame latency percentiles and peak memory of each stage.
+Run from apps_python:
+
+    python3 bench_tracking.py --tracker array --people 1 10 100 500
+"""
+
+import sys
+import json
+import argparse
+import tracemalloc
+import numpy as np
+from time import perf_counter
+from types import SimpleNamespace
+
+from post_process import PostProcessTracking
+from array_tracker import ArrayTracker
+
+
+class SyntheticCrowd:
+    """
+    Deterministic synthetic pedestrians for a fixed number of concurrent
+    people. The crowd mixes people crossing the scene in both directions,
+    people standing still for a while, occlusion behind pillars and missed
+    detections, and people leaving the scene while new ones enter.
+    """
+
+    def __init__(self, num_people, width=1280, height=720, fps=30, seed=0,
+                 still_ratio=0.2, pillars=2, miss_rate=0.02):
+        """
+        Args:
+            num_people: number of people in the scene at any time
+            width: frame width in pixels
+            height: frame height in pixels
+            fps: frame rate, used to convert walking speed and dwell times
+            seed: seed of the random generator
+            still_ratio: fraction of people who stop and stand still
+            pillars: number of vertical occluders hiding people behind them
+            miss_rate: probability of a missed detection per person per frame
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.still_ratio = still_ratio
+        self.miss_rate = miss_rate
+        self.rng = np.random.default_rng(seed)
+
+        pillar_w = width // 40
+        self.pillars = [
+            (x, x + pillar_w)
+            for x in np.linspace(0, width, pillars + 2)[1:-1].astype(int)
+        ]
+
+        self.center = np.zeros((num_people, 2))
+        self.velocity = np.zeros((num_people, 2))
+        self.size = np.zeros((num_people, 2))
+        self.walk_before_stop = np.zeros(num_people, int)  # frames left walking
+        self.dwell = np.zeros(num_people, int)  # frames left standing still
+        self.spawn(np.arange(num_people), anywhere=True)
+
+    def spawn(self, idx, anywhere=False):
+        """
+        Place new people at the left or right edge walking across the scene
+        Args:
+            idx: indices of the people to (re)spawn
+            anywhere: spread them over the whole frame (first frame)
+        """
+        k = len(idx)
+        rng = self.rng
+        height = rng.uniform(0.15, 0.3, k) * self.height
+        self.size[idx] = np.column_stack([0.4 * height, height])
+
+        direction = rng.choice([-1.0, 1.0], k)
+        speed = rng.uniform(40, 120, k) / self.fps  # pixels per frame
+        self.velocity[idx, 0] = direction * speed
+        self.velocity[idx, 1] = rng.normal(0, 0.1, k) * speed
+
+        if anywhere:
+            x = rng.uniform(0, self.width, k)
+        else:
+            x = np.where(direction > 0, -self.size[idx, 0] / 2, self.width + self.size[idx, 0] / 2)
+        y = rng.uniform(0.1, 0.9, k) * self.height
+        self.center[idx] = np.column_stack([x, y])
+
+        # some people stop somewhere along their path for a while
+        still = rng.random(k) < self.still_ratio
+        self.walk_before_stop[idx] = np.where(
+            still, rng.integers(0, 10 * self.fps, k), 0
+        )
+        self.dwell[idx] = np.where(
+            still, rng.integers(5 * self.fps, 60 * self.fps, k), 0
+        )
+
+    def step(self):
+        """
+        Advance the crowd by one frame
+        Returns:
+            boxes: (M, 4) visible boxes as [X1 Y1 X2 Y2] in pixels
+        """
+        walking = (self.walk_before_stop > 0) | (self.dwell == 0)
+        self.center[walking] += self.velocity[walking]
+        self.walk_before_stop[self.walk_before_stop > 0] -= 1
+        standing = (self.walk_before_stop == 0) & (self.dwell > 0)
+        self.dwell[standing] -= 1
+
+        # people who left the scene are replaced by new ones
+        half_w = self.size[:, 0] / 2
+        left = (self.center[:, 0] < -half_w) | (self.center[:, 0] > self.width + half_w)
+        if left.any():
+            self.spawn(np.flatnonzero(left))
+
+        jitter = self.rng.normal(0, 1.0, self.center.shape)
+        center = self.center + jitter
+        boxes = np.concatenate([center - self.size / 2, center + self.size / 2], axis=1)
+
+        visible = self.rng.random(len(boxes)) >= self.miss_rate
+        for x1, x2 in self.pillars:
+            visible &= ~((self.center[:, 0] > x1) & (self.center[:, 0] < x2))
+        boxes = boxes[visible]
+
+        np.clip(boxes[:, 0::2], 0, self.width - 1, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, self.height - 1, out=boxes[:, 1::2])
+        # people just entering or leaving can be clipped to an empty box
+        return boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+
+    def raw_detections(self, boxes, noise_rows=20):
+        """
+        Format boxes like a normalized detection model output, padded with
+        low score rows as a model would produce
+        Args:
+            boxes: (M, 4) boxes in pixels
+            noise_rows: number of rows below the visualization threshold
+        """
+        scale = np.array([self.width, self.height, self.width, self.height])
+        people = np.column_stack(
+            [boxes / scale, np.zeros(len(boxes)), self.rng.uniform(0.7, 0.95, len(boxes))]
+        )
+        noise = self.rng.uniform(0, 1, (noise_rows, 6))
+        noise[:, 4] = self.rng.integers(0, 80, noise_rows)
+        noise[:, 5] *= 0.5
+        return [np.concatenate([people, noise]).astype(np.float32)[np.newaxis]]
+
+
+def make_flow(args):
+    """
+    Minimal flow with the model parameters PostProcessTracking reads
+    """
+    tracking = SimpleNamespace(
+        tracker=args.tracker,
+        matching=args.matching,
+        analytics_worker=False,
+        history_size=10000,
+        history_retention=None,
+        heatmap_cell_size=args.heatmap_cell_size,
+        heatmap_mode=args.heatmap_mode,
+        heatmap_half_life=3600,
+        heatmap_window=900,
+        heatmap_buckets=15,
+        heatmap_file=None,
+        heatmap_flush_interval=60,
+        heatmap_pyramid=args.heatmap_pyramid,
+        heatmap_pyramid_span=60,
+        heatmap_pyramid_cell_size=32,
+        heatmap_pyramid_keep=128,
+    )
+    model = SimpleNamespace(
+        viz_threshold=0.6,
+        normalized_detections=True,
+        resize=[args.width, args.height],
+        shuffle_indices=None,
+        formatter=None,
+        ignore_index=None,
+        tracking=tracking,
+        inference=SimpleNamespace(detect_interval=1, motion_gate=False),
+    )
+    return SimpleNamespace(
+        model=model,
+        debug_config=None,
+        report=None,
+        sensor_width=args.width,
+        sensor_height=args.height,
+    )
+
+
+class StageTimer:
+    """
+    Collect per-frame latency and peak allocated memory of each stage
+    """
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.latency = {}
+        self.peak = {}
+
+    def __call__(self, stage, func, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+        start = perf_counter()
+        ret = func(*args, **kwargs)
+        self.latency.setdefault(stage, []).append(perf_counter() - start)
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak[stage] = max(self.peak.get(stage, 0), peak - before)
+        return ret
+
+
+def run_frames(post_proc, crowd, frame, num_frames, timer):
+    """
+    Run the stages of PostProcessTracking.__call__ one by one
+    """
+    for _ in range(num_frames):
+        results = crowd.raw_detections(crowd.step())
+        img = frame.copy()
+
+        bbox = timer("decode", post_proc.decoder, results)
+        boxes, scores = timer(
+            "decode", post_proc.decode_detections, bbox, img.shape[1], img.shape[0]
+        )
+        if isinstance(post_proc.tracker, ArrayTracker):
+            tracked_objects = timer("tracker", post_proc.tracker.update, boxes)
+        else:
+            detections = timer(
+                "tracker", post_proc.yolo_detections_to_norfair_detections, boxes, scores
+            )
+            tracked_objects = timer(
+                "tracker", post_proc.tracker.update, detections=detections
+            )
+        timer("time count", post_proc.timeCount.update, tracked_objects)
+        timer("heatmap", post_proc.heatMap.update, boxes)
+        timer("dashboard", post_proc.dashBoard.update_dashboard, img)
+        img = timer("path draw", post_proc.pathd.draw, img, tracked_objects)
+        timer("time draw", post_proc.timeCount.draw_time, img, 1.5, 3)
+        timer("compose", post_proc.dashBoard.add_dashboard, img)
+
+
+def bench(args, num_people):
+    """
+    Benchmark all stages for one crowd size
+    """
+    stats = {}
+    frame = np.zeros((args.height, args.width, 3), np.uint8)
+    for trace_memory in (False, True):
+        if trace_memory and args.no_memory:
+            break
+        crowd = SyntheticCrowd(num_people, args.width, args.height, args.fps, args.seed)
+        post_proc = PostProcessTracking(make_flow(args))
+        post_proc.dashBoard.update_freq = args.dashboard_period
+
+        run_frames(post_proc, crowd, frame, args.warmup, StageTimer(False))
+        timer = StageTimer(trace_memory)
+        if trace_memory:
+            tracemalloc.start()
+        run_frames(post_proc, crowd, frame, args.frames, timer)
+        if trace_memory:
+            tracemalloc.stop()
+            for stage, peak in timer.peak.items():
+                stats[stage]["peak_kib"] = peak / 1024
+            continue
+
+        for stage, samples in timer.latency.items():
+            samples = np.asarray(samples)
+            if stage in ("decode", "tracker"):
+                # these stages are timed in two calls per frame
+                samples = samples.reshape(args.frames, -1).sum(axis=1)
+            samples = samples * 1000
+            stats[stage] = {
+                "p50_ms": float(np.percentile(samples, 50)),
+                "p90_ms": float(np.percentile(samples, 90)),
+                "p99_ms": float(np.percentile(samples, 99)),
+                "max_ms": float(samples.max()),
+            }
+        stats["tracks"] = {"active": len(post_proc.timeCount.current_object_time)}
+    return stats
+
+
+def print_stats(num_people, stats):
+    print("\n[%d people, %d active tracks]" % (num_people, stats["tracks"]["active"]))
+    print("%-12s %9s %9s %9s %9s %11s" % ("stage", "p50 ms", "p90 ms", "p99 ms", "max ms", "peak KiB"))
+    for stage, s in stats.items():
+        if stage == "tracks":
+            continue
+        peak = "%11.1f" % s["peak_kib"] if "peak_kib" in s else "%11s" % "-"
+        print(
+            "%-12s %9.3f %9.3f %9.3f %9.3f %s"
+            % (stage, s["p50_ms"], s["p90_ms"], s["p99_ms"], s["max_ms"], peak)
+        )
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--people", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500],
+                        help="Concurrent people in the scene")
+    parser.add_argument("--tracker", choices=["norfair", "array"], default="norfair")
+    parser.add_argument("--matching", choices=["greedy", "hungarian"], default="greedy")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=150, help="Measured frames")
+    parser.add_argument("--warmup", type=int, default=30, help="Frames before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--heatmap-cell-size", type=int, default=8,
+                        help="Heatmap grid cell size in pixels")
+    parser.add_argument("--heatmap-mode", choices=["cumulative", "decay", "window"],
+                        default="cumulative")
+    parser.add_argument("--heatmap-pyramid", action="store_true",
+                        help="Also write the time bucketed heatmap pyramid")
+    parser.add_argument("--dashboard-period", type=float, default=0,
+                        help="Dashboard refresh period in seconds\n"
+                        + "default: 0, refresh every frame")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the tracemalloc pass")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args(argv[1:])
+
+    results = {}
+    for num_people in args.people:
+        stats = bench(args, num_people)
+        print_stats(num_people, stats)
+        results[num_people] = stats
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
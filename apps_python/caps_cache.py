@@ -0,0 +1,147 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Cache of the capabilities probed from the GStreamer element factories.
+
+Building the pipelines asks the same factories for the formats and the
+presence of their pads over and over. The answers only change with the
+installed plugins, so they are kept for the process and saved to a file
+named after the SOC and a fingerprint of the GStreamer registry. Later
+runs on the same setup load it and skip probing.
+"""
+
+import os
+import json
+import hashlib
+
+# Bump when the format of the saved entries changes
+CACHE_VERSION = 1
+
+
+def default_dir():
+    """
+    Directory holding the cache files, under XDG_CACHE_HOME
+    """
+    base = os.environ.get("XDG_CACHE_HOME")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "edgeai-gst-apps")
+
+
+def registry_fingerprint(version, plugins):
+    """
+    Short hash identifying a GStreamer installation
+    Args:
+        version: GStreamer version string
+        plugins: iterable of (name, version, filename) of the loaded plugins
+    """
+    h = hashlib.sha1(version.encode())
+    for plugin in sorted(plugins):
+        h.update(("\0".join(str(p) for p in plugin) + "\n").encode())
+    return h.hexdigest()[:16]
+
+
+class CapsCache:
+    """
+    Memo of (kind, factory, pad) -> JSON serializable value
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: file the cache is loaded from and saved to, None to keep
+                  it in memory only
+        """
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+
+    @staticmethod
+    def key(kind, factory, pad):
+        return "%s/%s/%s" % (kind, factory, pad)
+
+    def get(self, kind, factory, pad, probe):
+        """
+        Get a cached value, calling probe() to fill it on a miss
+        Args:
+            kind: what is asked, e.g. "format"
+            factory: name of the element factory
+            pad: "src" or "sink"
+            probe: function returning the value from GStreamer
+        """
+        key = CapsCache.key(kind, factory, pad)
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        value = probe()
+        self.entries[key] = value
+        self.dirty = True
+        return value
+
+    def load(self):
+        """
+        Load the entries saved by a previous run, if any
+        """
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if type(data) != dict or data.get("version") != CACHE_VERSION:
+            return
+        entries = data.get("entries")
+        if type(entries) == dict:
+            self.entries.update(entries)
+
+    def save(self):
+        """
+        Save the entries if new ones were probed. A cache which cannot be
+        written only costs the probing on the next run.
+        """
+        if not self.path or not self.dirty:
+            return
+        data = {"version": CACHE_VERSION, "entries": self.entries}
+        tmp = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError as e:
+            print("[WARNING] Could not save caps cache %s: %s" % (self.path, e))
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -195,6 +195,225 @@ class Output:
         return disp_id
 
 
+class Tracking:
+    """
+    Class to parse and store people tracking parameters
+    """
+
+    def __init__(self, model_config):
+        """
+        Constructor of Tracking class
+        Args:
+            model_config: Dictionary of model params provided in config file
+        """
+        if "tracker" in model_config:
+            self.tracker = model_config["tracker"]
+        else:
+            self.tracker = "norfair"
+        if self.tracker not in ("norfair", "array"):
+            print("[ERROR] Unknown tracker %s. Use norfair or array." % self.tracker)
+            sys.exit()
+        if "tracker_matching" in model_config:
+            self.matching = model_config["tracker_matching"]
+        else:
+            self.matching = "greedy"
+        if self.matching not in ("greedy", "hungarian"):
+            print("[ERROR] Unknown tracker_matching %s. Use greedy or hungarian." % self.matching)
+            sys.exit()
+        if "analytics_worker" in model_config:
+            self.analytics_worker = model_config["analytics_worker"]
+        else:
+            self.analytics_worker = False
+        if "history_size" in model_config:
+            self.history_size = model_config["history_size"]
+        else:
+            self.history_size = 10000
+        if "history_retention" in model_config:
+            self.history_retention = model_config["history_retention"]
+        else:
+            self.history_retention = None
+        if "heatmap_cell_size" in model_config:
+            self.heatmap_cell_size = model_config["heatmap_cell_size"]
+        else:
+            self.heatmap_cell_size = 8
+        if type(self.heatmap_cell_size) != int or self.heatmap_cell_size < 1:
+            print("[ERROR] heatmap_cell_size must be a positive integer.")
+            sys.exit()
+        if "heatmap_mode" in model_config:
+            self.heatmap_mode = model_config["heatmap_mode"]
+        else:
+            self.heatmap_mode = "cumulative"
+        if self.heatmap_mode not in ("cumulative", "decay", "window"):
+            print(
+                "[ERROR] Unknown heatmap_mode %s. Use cumulative, decay or window."
+                % self.heatmap_mode
+            )
+            sys.exit()
+        if "heatmap_half_life" in model_config:
+            self.heatmap_half_life = model_config["heatmap_half_life"]
+        else:
+            self.heatmap_half_life = 3600
+        if "heatmap_window" in model_config:
+            self.heatmap_window = model_config["heatmap_window"]
+        else:
+            self.heatmap_window = 900
+        if "heatmap_buckets" in model_config:
+            self.heatmap_buckets = model_config["heatmap_buckets"]
+        else:
+            self.heatmap_buckets = 15
+        if "heatmap_file" in model_config:
+            self.heatmap_file = model_config["heatmap_file"]
+        else:
+            self.heatmap_file = None
+        if "heatmap_flush_interval" in model_config:
+            self.heatmap_flush_interval = model_config["heatmap_flush_interval"]
+        else:
+            self.heatmap_flush_interval = 60
+        if "heatmap_pyramid" in model_config:
+            self.heatmap_pyramid = model_config["heatmap_pyramid"]
+        else:
+            self.heatmap_pyramid = False
+        if "heatmap_pyramid_span" in model_config:
+            self.heatmap_pyramid_span = model_config["heatmap_pyramid_span"]
+        else:
+            self.heatmap_pyramid_span = 60
+        if "heatmap_pyramid_cell_size" in model_config:
+            self.heatmap_pyramid_cell_size = model_config["heatmap_pyramid_cell_size"]
+        else:
+            self.heatmap_pyramid_cell_size = 32
+        if "heatmap_pyramid_keep" in model_config:
+            self.heatmap_pyramid_keep = model_config["heatmap_pyramid_keep"]
+        else:
+            self.heatmap_pyramid_keep = 128
+        if "heatmap_pyramid_range" in model_config:
+            self.heatmap_pyramid_range = model_config["heatmap_pyramid_range"]
+        else:
+            self.heatmap_pyramid_range = None
+        if self.heatmap_pyramid_range is not None and (
+            not self.heatmap_pyramid
+            or type(self.heatmap_pyramid_range) not in [int, float]
+            or self.heatmap_pyramid_range <= 0
+        ):
+            print("[ERROR] heatmap_pyramid_range must be a positive number of seconds and needs heatmap_pyramid.")
+            sys.exit()
+        if self.heatmap_file and self.heatmap_mode == "window":
+            print("[ERROR] heatmap_file is not supported with the window heatmap_mode.")
+            sys.exit()
+
+
+class Inference:
+    """
+    Class to parse and store inference scheduling parameters
+    """
+
+    def __init__(self, model_config):
+        """
+        Constructor of Inference class
+        Args:
+            model_config: Dictionary of model params provided in config file
+        """
+        if "detect_interval" in model_config:
+            self.detect_interval = model_config["detect_interval"]
+        else:
+            self.detect_interval = 1
+        if type(self.detect_interval) != int or self.detect_interval < 1:
+            print("[ERROR] detect_interval must be a positive integer.")
+            sys.exit()
+        if "motion_gate" in model_config:
+            self.motion_gate = model_config["motion_gate"]
+        else:
+            self.motion_gate = False
+        if "motion_heartbeat" in model_config:
+            self.motion_heartbeat = model_config["motion_heartbeat"]
+        else:
+            self.motion_heartbeat = 30
+        if "motion_threshold" in model_config:
+            self.motion_threshold = model_config["motion_threshold"]
+        else:
+            self.motion_threshold = 25
+        if "motion_ratio" in model_config:
+            self.motion_ratio = model_config["motion_ratio"]
+        else:
+            self.motion_ratio = 0.002
+        if "pipelined" in model_config:
+            self.pipelined = model_config["pipelined"]
+        else:
+            self.pipelined = False
+        if "queue_depth" in model_config:
+            self.queue_depth = model_config["queue_depth"]
+        else:
+            self.queue_depth = 2
+        if type(self.queue_depth) != int or self.queue_depth < 1:
+            print("[ERROR] queue_depth must be a positive integer.")
+            sys.exit()
+        if "pts_pairing" in model_config:
+            self.pts_pairing = model_config["pts_pairing"]
+        else:
+            self.pts_pairing = True
+        if "pts_window" in model_config:
+            self.pts_window = model_config["pts_window"]
+        else:
+            self.pts_window = 4
+        if type(self.pts_window) != int or self.pts_window < 0:
+            print("[ERROR] pts_window must be a non-negative integer.")
+            sys.exit()
+        if "output_pool_size" in model_config:
+            self.output_pool_size = model_config["output_pool_size"]
+        else:
+            self.output_pool_size = 4
+        if type(self.output_pool_size) != int or self.output_pool_size < 1:
+            print("[ERROR] output_pool_size must be a positive integer.")
+            sys.exit()
+
+
+class Delivery:
+    """
+    Class to parse and store how samples are delivered from the appsinks
+    """
+
+    def __init__(self, delivery_config):
+        """
+        Constructor of Delivery class
+        Args:
+            delivery_config: Dictionary of delivery params provided in config file
+        """
+        if "mode" in delivery_config:
+            self.mode = delivery_config["mode"]
+        else:
+            self.mode = "pull"
+        if self.mode not in ["pull", "callback"]:
+            print("[ERROR] delivery mode must be pull or callback.")
+            sys.exit()
+        if "mailbox" in delivery_config:
+            self.mailbox = delivery_config["mailbox"]
+        else:
+            self.mailbox = "latest"
+        if self.mailbox not in ["latest", "fifo"]:
+            print("[ERROR] delivery mailbox must be latest or fifo.")
+            sys.exit()
+        if "mailbox_depth" in delivery_config:
+            self.mailbox_depth = delivery_config["mailbox_depth"]
+        else:
+            self.mailbox_depth = 2
+        if type(self.mailbox_depth) != int or self.mailbox_depth < 1:
+            print("[ERROR] mailbox_depth must be a positive integer.")
+            sys.exit()
+        if "workers" in delivery_config:
+            self.workers = delivery_config["workers"]
+        else:
+            self.workers = 2
+        if type(self.workers) != int or self.workers < 1:
+            print("[ERROR] delivery workers must be a positive integer.")
+            sys.exit()
+        if "stall_periods" in delivery_config:
+            self.stall_periods = delivery_config["stall_periods"]
+        else:
+            self.stall_periods = 4
+        if type(self.stall_periods) not in [int, float] or self.stall_periods <= 0:
+            print("[ERROR] stall_periods must be a positive number.")
+            sys.exit()
+
+
 class Flow:
     """
     Class to create and manage sub flows
@@ -29,14 +29,11 @@
 #  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from matplotlib.backends.backend_agg import FigureCanvasAgg
-from matplotlib.ticker import MaxNLocator
-from matplotlib.figure import Figure
 from lite_plot import LitePlot
-import matplotlib.pyplot as plt
 import numpy as np
 import copy
 import cv2
+import text_cache
 
 from time import time
 
@@ -63,8 +60,6 @@ class Dashboard:
 
         self.text_color = [255, 255, 255]
 
-        self.back_color = np.array([83, 39, 41]) / 255           # GBR
-
         self.bin_color_blue = (1,209,255)      # RGB
 
         self.bin_color_red = (166,0,0)         # RGB
@@ -87,7 +82,10 @@ class Dashboard:
         self.current_occupancy = 0
         self.total_vistors = 0
 
-        self.fig, self.canvas, self.ax = self.plot_prepare()
+        # histogram plots live as long as the dashboard, so their layout and
+        # static part are only rendered once
+        self.still_time_plot = self.create_hist_plot("Still Time")
+        self.total_time_plot = self.create_hist_plot("Total Time")
 
         # initiate dashboard for the first time.
         self.init_dashboard()
@@ -106,12 +104,11 @@ class Dashboard:
         # add total visitors ticket
         self.dashboard[10:80, 10:275, :] = self.single_value_ticket(ticket_h, ticket_w, self.ticket_color, self.text_color, "Total Visitors", total_vistors)
 
-        total_time_array = [0]
-        still_time_array = [0]
+        empty_hist = np.histogram([0], bins=12, range=(0,60))
    
-        self.dashboard[90:240, 10:550, :] = self.hist_plot_test("Still Time", still_time_array, self.back_color, self.bin_color_green)
+        self.dashboard[90:240, 10:550, :] = self.hist_plot_test(self.still_time_plot, empty_hist, self.bin_color_green)
 
-        self.dashboard[250:400, 10:550, :] = self.hist_plot_test("Total Time", total_time_array, self.back_color, self.bin_color_blue)
+        self.dashboard[250:400, 10:550, :] = self.hist_plot_test(self.total_time_plot, empty_hist, self.bin_color_blue)
 
         self.dashboard[410:710, 10:550, :] = self.create_image(300, 540, self.ticket_color)
 
@@ -119,41 +116,65 @@ class Dashboard:
 
     def update_dashboard(self, frame):
 
+        self.update_tickets()
+
+        if not self.refresh_due():
+            return self.dashboard
+
+        self.update_plots(frame)
+
+        return self.dashboard
+
+    def update_tickets(self):
+        """
+        Update the occupancy and visitor tickets if their values changed.
+        Returns:
+            True if the dashboard image changed
+        """
         ticket_h = 70
         ticket_w = 265
+        changed = False
 
         current_occupancy,total_vistors = self.timeCount.get_occupancy()
         if self.current_occupancy != current_occupancy:
             self.current_occupancy = current_occupancy
             # add current occupancy teicket
             self.dashboard[10:80, 285:550, :] = self.single_value_ticket(ticket_h, ticket_w, self.ticket_color, self.text_color, "Current Occupancy", current_occupancy)
+            changed = True
         
         if self.total_vistors !=  total_vistors:
             self.total_vistors = total_vistors
             # add total visitors ticket
             self.dashboard[10:80, 10:275, :] = self.single_value_ticket(ticket_h, ticket_w, self.ticket_color, self.text_color, "Total Visitors", total_vistors)
+            changed = True
 
-        current_time = time()
+        return changed
 
-        if current_time - self.prev_time < self.update_freq:
-            return self.dashboard
+    def refresh_due(self):
+        """
+        Check if update_freq seconds passed since the last plot refresh.
+        """
+        return time() - self.prev_time >= self.update_freq
 
-        self.prev_time = current_time
+    def update_plots(self, frame):
+        """
+        Re-render the histograms and the heatmap.
+        Parameters:
+            frame (numpy array): frame used as background of the heatmap.
+        """
+        self.prev_time = time()
 
-        total_time_array, still_time_array = self.timeCount.get_time_history()
+        total_time_hist, still_time_hist = self.timeCount.get_time_histograms()
 
-        self.dashboard[90:240, 10:550, :] = self.hist_plot_test("Still Time", still_time_array, self.back_color, self.bin_color_green)
+        self.dashboard[90:240, 10:550, :] = self.hist_plot_test(self.still_time_plot, still_time_hist, self.bin_color_green)
 
-        self.dashboard[250:400, 10:550, :] = self.hist_plot_test("Total Time", total_time_array, self.back_color, self.bin_color_blue)
+        self.dashboard[250:400, 10:550, :] = self.hist_plot_test(self.total_time_plot, total_time_hist, self.bin_color_blue)
         
 
         resize = (540,300)
 
         self.dashboard[410:710, 10:550, :] = self.heat_map(frame, resize, title="Occupancy HeatMap", title_color=(255,255,255))
 
-        return self.dashboard
-
-    
     def single_value_ticket(self, h, w, back_color, text_color, title, value):
         """
         Create a ticket with a title and a value.
@@ -174,16 +195,16 @@ class Dashboard:
         # add title
         for i, line in enumerate(title.split(' ')):
 
-            (text_w, text_h),_ = cv2.getTextSize(line, cv2.FONT_HERSHEY_DUPLEX, 0.8, 1)
+            (text_w, text_h),_ = text_cache.get_text_size(line, cv2.FONT_HERSHEY_DUPLEX, 0.8, 1)
             x = 10
             y = int((i+1)*(text_h+5) + 10)
-            cv2.putText(ticket, line,(x,y) , cv2.FONT_HERSHEY_DUPLEX, 0.8, text_color, 1)
+            text_cache.put_text(ticket, line,(x,y) , cv2.FONT_HERSHEY_DUPLEX, 0.8, text_color, 1)
 
         # add value 
-        (text_w, text_h),_ = cv2.getTextSize(str(value), cv2.FONT_HERSHEY_DUPLEX, 2, 2)
+        (text_w, text_h),_ = text_cache.get_text_size(str(value), cv2.FONT_HERSHEY_DUPLEX, 2, 2)
         text_start = int(w-10 - text_w)
         y = int(text_h + (h - text_h)/2)
-        cv2.putText(ticket, str(value),(text_start,y) , cv2.FONT_HERSHEY_DUPLEX, 2, text_color, 2)
+        text_cache.put_text(ticket, str(value),(text_start,y) , cv2.FONT_HERSHEY_DUPLEX, 2, text_color, 2, glyphs=True)
 
 
         return ticket
@@ -194,64 +215,13 @@ class Dashboard:
 
         # add title to heatmap
         if title is not None:
-            (text_w, text_h),_ = cv2.getTextSize(title, cv2.FONT_HERSHEY_DUPLEX, 1, 2)
+            (text_w, text_h),_ = text_cache.get_text_size(title, cv2.FONT_HERSHEY_DUPLEX, 1, 2)
             text_bottom = 10 + text_h
-            cv2.putText(hm, title,(10,text_bottom) , cv2.FONT_HERSHEY_DUPLEX, 1, title_color, 2)
+            text_cache.put_text(hm, title,(10,text_bottom) , cv2.FONT_HERSHEY_DUPLEX, 1, title_color, 2)
 
         return hm
 
 
-    def hist_plot(self, title, data, back_color, bin_color):
-        # make a Figure and attach it to a canvas.
-        fig = Figure(figsize=(5.4, 1.5), dpi=100)
-        fig.set_facecolor(back_color)
-        fig.subplots_adjust(bottom=0.18, top=0.8)
-        canvas = FigureCanvasAgg(fig)
-
-        ax = fig.gca()
-        # ax.set_adjustable
-        if not data:
-            bin_range = (0,60)
-        else:
-            bin_range = (0,max([60,max(data)]))
-
-        n,_,_ = ax.hist(data, bins=12,range= bin_range, color=bin_color, rwidth=0.7)
-        
-        ax.set_title(title, loc='left', color='white', fontsize= 16, fontweight='bold')
-
-        ax.set_xlabel("Time [Sec]", color='white', fontsize= 10)
-        ax.xaxis.set_label_coords(-0.05,-0.08)
-
-
-        ax.set_facecolor(self.back_color)
-
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['bottom'].set_visible(False)
-        # ax.spines['left'].set_visible(False)
-        ax.spines['left'].set_color('white')
-
-        ax.tick_params(axis='x', colors='white')
-        ax.tick_params(axis='y', colors='white')
-
-        max_bin = max(n)
-        y_tick_setp,r = divmod(max_bin, 4)
-        y_tick_setp +=1
-        y_tick = np.arange(0,y_tick_setp*4, y_tick_setp)
-        ax.set_yticks(y_tick)
-
-        ax.margins(0.01)
-        # Retrieve a view on the renderer buffer
-        canvas.draw()
-        buf = canvas.buffer_rgba()
-        # convert to a NumPy array
-        hist_img = np.asarray(buf)
-
-        hist_img = cv2.cvtColor(hist_img, cv2.COLOR_RGB2BGR)
-
-        
-        return hist_img
-    
     def create_image(self, h,w,color):
         """
         Create a colored image and fill it with a single color.
@@ -264,7 +234,12 @@ class Dashboard:
         image[:] = color
         return image
     
-    def hist_plot_test(self, title, data, back_color, bin_color):
+    def create_hist_plot(self, title):
+        """
+        Create the plot used for a histogram ticket.
+        Parameters:
+            title (string): histogram title.
+        """
 
         margin = {'left': 40, 'bottom': 5}
         tick_dict = {'text_size': 0.5}
@@ -281,28 +256,38 @@ class Dashboard:
                       boarders=boarder_dict,
                       ticks=tick_dict)
 
-        if not data:
-            bin_range = (0,60)
-        else:
-            bin_range = (0,max([60,max(data)]))
+        return lp
 
-        hist_ticket = lp.hist(data, bins = 12, yrange=bin_range, rwidth=0.7, color=bin_color)
+    def hist_plot_test(self, lp, hist, bin_color):
+        """
+        Draw a histogram ticket. Only the bars and the tick labels that
+        changed since the last call are redrawn.
+        Parameters:
+            lp (LitePlot): plot from create_hist_plot.
+            hist (tuple): bin counts and bin edges.
+            bin_color (tuple): bar color.
+        """
+        val, bin_edge = hist
+        hist_ticket = lp.update_hist(val, bin_edge, rwidth=0.7, color=bin_color)
     
         return hist_ticket
     
 
-    def plot_prepare(self):
-        # make a Figure and attach it to a canvas.
-        fig = Figure(figsize=(5.4, 1.5), dpi=100)
-        fig.set_facecolor(self.back_color)
-        fig.subplots_adjust(bottom=0.18, top=0.8)
-        canvas = FigureCanvasAgg(fig)
-
-        ax = fig.gca()
-
-        return fig, canvas, ax
-    
-    def add_dashboard(self, frame):
-        self.output_frame[0:720,0:560,:] = self.dashboard
-        self.output_frame[0:720, 560:1840, :] = frame
-        return self.output_frame
\ No newline at end of file
+    def add_dashboard(self, frame, dashboard=None, out=None):
+        """
+        Place the dashboard left of the frame.
+        Parameters:
+            frame (numpy array): frame with overlays.
+            dashboard (numpy array): dashboard image to use instead of the
+                one rendered by this object, e.g. from AnalyticsWorker.
+            out (numpy array): array to compose the output into, e.g. a
+                pooled output buffer. Ignored if it is not 720x1840.
+        """
+        if dashboard is None:
+            dashboard = self.dashboard
+        output_frame = self.output_frame
+        if out is not None and out.shape == output_frame.shape:
+            output_frame = out
+        output_frame[0:720,0:560,:] = dashboard
+        output_frame[0:720, 560:1840, :] = frame
+        return output_frame
\ No newline at end of file
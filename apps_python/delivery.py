@@ -0,0 +1,285 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Callback driven delivery of appsink samples.
+
+Appsinks hand their samples to a Mailbox from the new-sample callback, so
+no thread blocks pulling them. A Dispatcher runs the InferPipes whose
+mailboxes have samples on a small pool of worker threads, and a watchdog
+reports streams which delivered nothing for longer than their deadline.
+"""
+
+import threading
+import queue
+from collections import deque
+from time import monotonic, sleep
+
+# Returned by Mailbox.get once the stream reached its end
+EOS = object()
+
+
+class Mailbox:
+    """
+    Hand-off of samples from an appsink callback to its consumer.
+
+    latest: only the newest sample is kept, older unread ones are dropped.
+    fifo: up to depth samples are queued. The callback waits for room when
+    it is full, which holds back the pipeline like an appsink without drop.
+    """
+
+    def __init__(self, mode="latest", depth=2, on_put=None, timeout=1.0):
+        """
+        Args:
+            mode: latest or fifo
+            depth: maximum queued samples in fifo mode
+            on_put: function called after a sample or EOS is delivered
+            timeout: seconds a consumer waits before checking the mailbox
+                     is still open, the stall deadline of the stream
+        """
+        self.mode = mode
+        self.depth = depth
+        self.on_put = on_put
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.items = deque()
+        self.eos = False
+        self.closed = False
+        # set around a flushing seek, samples are dropped meanwhile
+        self.flushing = False
+        self.dropped = 0
+        self.last_put = None
+
+    def put(self, item):
+        """
+        Deliver a sample. Called from the streaming thread.
+        """
+        with self.cond:
+            if self.mode == "latest":
+                self.dropped += len(self.items)
+                self.items.clear()
+            else:
+                while (
+                    len(self.items) >= self.depth
+                    and not self.closed
+                    and not self.flushing
+                ):
+                    self.cond.wait()
+            if self.flushing or self.closed:
+                # sample from before a seek or for a stopped consumer, do not
+                # block the streaming thread
+                self.dropped += 1
+                return
+            self.items.append(item)
+            self.last_put = monotonic()
+            self.cond.notify_all()
+        if self.on_put:
+            self.on_put()
+
+    def set_eos(self):
+        """
+        Mark the end of the stream, after the samples already queued
+        """
+        with self.cond:
+            self.eos = True
+            self.last_put = monotonic()
+            self.cond.notify_all()
+        if self.on_put:
+            self.on_put()
+
+    def get(self, timeout):
+        """
+        Get the oldest sample
+        Args:
+            timeout: maximum time to wait for a sample in seconds
+        Returns:
+            the sample, EOS at the end of the stream or None on timeout
+        """
+        deadline = monotonic() + timeout
+        with self.cond:
+            while not self.items and not self.eos and not self.closed:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            if self.items:
+                item = self.items.popleft()
+                self.cond.notify_all()
+                return item
+            if self.eos:
+                return EOS
+            return None
+
+    def wait(self):
+        """
+        Wait for the next sample as long as the mailbox is open. Stalls are
+        reported by the watchdog, the wait only ends on shutdown.
+        Returns:
+            the sample, EOS at the end of the stream or None once closed
+        """
+        while True:
+            item = self.get(self.timeout)
+            if item is not None or self.closed:
+                return item
+
+    def ready(self):
+        """
+        Check if get() would return without waiting
+        """
+        with self.cond:
+            return len(self.items) > 0 or self.eos
+
+    def start_flush(self):
+        """
+        Drop the queued samples and the EOS mark before a flushing seek.
+        Until stop_flush, delivered samples are dropped instead of queued,
+        so a streaming thread blocked in put is released for the flush.
+        """
+        with self.cond:
+            self.flushing = True
+            self.dropped += len(self.items)
+            self.items.clear()
+            self.eos = False
+            self.cond.notify_all()
+
+    def stop_flush(self):
+        """
+        Accept samples again once the flushing seek is done
+        """
+        with self.cond:
+            self.flushing = False
+
+    def close(self):
+        """
+        Wake up the producer and the consumer for shutdown
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class Dispatcher:
+    """
+    Pool of worker threads running the InferPipes in callback delivery
+    mode. A pipe is scheduled when a sample arrives and runs on one worker
+    at a time, one frame per step, so that many streams share a few
+    threads instead of one thread each.
+    """
+
+    # Seconds between two checks of the watchdog
+    WATCHDOG_PERIOD = 0.1
+
+    def __init__(self, workers=2):
+        """
+        Args:
+            workers: number of worker threads
+        """
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        # pipes queued or running
+        self.busy = set()
+        self.pipes = []
+        self.stop_thread = False
+        self.threads = [
+            threading.Thread(target=self.run, daemon=True) for _ in range(workers)
+        ]
+        self.watchdog_thread = threading.Thread(target=self.watchdog, daemon=True)
+        for t in self.threads:
+            t.start()
+        self.watchdog_thread.start()
+
+    def watch(self, pipe):
+        """
+        Add a pipe to the stall watchdog
+        """
+        with self.lock:
+            self.pipes.append(pipe)
+
+    def schedule(self, pipe):
+        """
+        Queue a step of a pipe unless one is already queued or running
+        """
+        with self.lock:
+            if pipe in self.busy:
+                return
+            self.busy.add(pipe)
+        self.queue.put(pipe)
+
+    def run(self):
+        """
+        Callback function for the worker threads
+        """
+        while True:
+            pipe = self.queue.get()
+            if pipe is None:
+                break
+            try:
+                active = pipe.step()
+            except Exception as e:
+                print("[ERROR] Inference pipe failed: %s" % repr(e))
+                active = False
+                try:
+                    pipe.finish()
+                except Exception as e:
+                    print("[ERROR] Could not finish inference pipe: %s" % repr(e))
+            with self.lock:
+                self.busy.discard(pipe)
+                # samples which arrived during the step did not schedule it
+                again = active and pipe.ready()
+            if again:
+                self.schedule(pipe)
+
+    def watchdog(self):
+        """
+        Callback function for the watchdog thread
+        """
+        while not self.stop_thread:
+            sleep(Dispatcher.WATCHDOG_PERIOD)
+            now = monotonic()
+            with self.lock:
+                pipes = list(self.pipes)
+            for pipe in pipes:
+                pipe.check_stall(now)
+
+    def stop(self):
+        """
+        Stop the worker and watchdog threads and finish the pipes. The pipes
+        must be stopped first, so that no step waits for a sample.
+        """
+        self.stop_thread = True
+        for _ in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        # idle pipes are not stepped again to notice the stop
+        with self.lock:
+            pipes = list(self.pipes)
+        for pipe in pipes:
+            pipe.finish()
@@ -29,10 +29,12 @@
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import config_parser
+import delivery
 import gst_wrapper
 from gst_element_map import gst_element_map
 from edgeai_dl_inferer import ModelConfig
 from infer_pipe import InferPipe
+import startup_profile
 import utils
 import sys
 import os
@@ -102,10 +104,11 @@ class EdgeAIDemo:
                 elif (gst_element_map['inferer']['target'] != 'arm'):
                     print("[WARNING] Invalid target specified for inferer. Defaulting to ARM.")
 
-                model_obj = ModelConfig(model_path,enable_tidl,core_id)
+                with startup_profile.phase("model %s" % model):
+                    model_obj = ModelConfig(model_path,enable_tidl,core_id)
 
-                # Initialize the runtime
-                model_obj.create_runtime()
+                    # Initialize the runtime
+                    model_obj.create_runtime()
 
                 # task specific params
                 if "alpha" in model_config:
@@ -114,18 +117,22 @@ class EdgeAIDemo:
                     model_obj.viz_threshold = model_config["viz_threshold"]
                 if "topN" in model_config:
                     model_obj.topN = model_config["topN"]
+                model_obj.tracking = config_parser.Tracking(model_config)
+                model_obj.inference = config_parser.Inference(model_config)
 
                 self.models[model] = model_obj
 
             if input not in self.inputs:
                 input_config = config["inputs"][input]
-                input_obj = config_parser.Input(input_config)
+                with startup_profile.phase("input %s" % input):
+                    input_obj = config_parser.Input(input_config)
                 input_obj.name = input
                 self.inputs[input] = input_obj
 
             if output not in self.outputs:
                 output_config = config["outputs"][output]
-                output_obj = config_parser.Output(output_config, self.title)
+                with startup_profile.phase("output %s" % output):
+                    output_obj = config_parser.Output(output_config, self.title)
                 self.outputs[output] = output_obj
 
             # Set mosaic and start bg_pipeline
@@ -141,6 +148,15 @@ class EdgeAIDemo:
         else:
             debug_config = None
 
+        if "delivery" in config:
+            self.delivery = config_parser.Delivery(config["delivery"])
+        else:
+            self.delivery = config_parser.Delivery({})
+        if self.delivery.mode == "callback":
+            self.dispatcher = delivery.Dispatcher(self.delivery.workers)
+        else:
+            self.dispatcher = None
+
         for input in self.inputs:
             input_obj = self.inputs[input]
             subflow_dictionary = {}
@@ -181,19 +197,24 @@ class EdgeAIDemo:
                 output_objs, mosaic_list = subflow_dictionary[model]
                 subflow_list.append([model_obj, output_objs, mosaic_list])
 
-            self.flows.append(config_parser.Flow(input_obj, subflow_list, debug_config))
+            with startup_profile.phase("flow %s" % input):
+                self.flows.append(config_parser.Flow(input_obj, subflow_list, debug_config))
 
-        self.src_pipes, self.sink_pipe = gst_wrapper.get_gst_pipe(
-            self.flows, self.outputs
-        )
-        self.gst_pipe = gst_wrapper.GstPipe(self.src_pipes, self.sink_pipe)
+        with startup_profile.phase("gst pipeline"):
+            self.src_pipes, self.sink_pipe = gst_wrapper.get_gst_pipe(
+                self.flows, self.outputs
+            )
+            self.gst_pipe = gst_wrapper.GstPipe(self.src_pipes, self.sink_pipe)
 
         for o in self.outputs.values():
             o.gst_pipe = self.gst_pipe
 
         for f in self.flows:
             for s in f.sub_flows:
-                self.infer_pipes.append(InferPipe(s, self.gst_pipe))
+                with startup_profile.phase("infer pipe %d (%s)" % (s.id, s.model.task_type)):
+                    self.infer_pipes.append(
+                        InferPipe(s, self.gst_pipe, self.delivery, self.dispatcher)
+                    )
 
     def start(self):
         """
@@ -246,6 +267,9 @@ class EdgeAIDemo:
         for i in self.infer_pipes:
             i.stop()
 
+        if self.dispatcher:
+            self.dispatcher.stop()
+
         self.gst_pipe.free()
 
         # Hack del for model_obj is not called since refcount is not 1 here.
@@ -9,7 +9,9 @@ import sys
 import utils
 import time
 from threading import Lock
-from gst_element_map import gst_element_map
+from gst_element_map import gst_element_map, SOC
+import caps_cache
+import delivery
 
 Gst.init(None)
 
@@ -17,6 +19,187 @@ preproc_target_idx = 0
 isp_target_idx = 0
 ldc_target_idx = 0
 
+
+class FrameHandle:
+    """
+    Sample pulled from an appsink and kept mapped until it is released.
+    data is a numpy view of the mapped memory, so it must not be used after
+    release(). Use the handle as a context manager or call release().
+
+    Handles are counted, so that samples which are never released show up
+    in the report instead of silently holding buffers of the pool.
+    """
+
+    lock = Lock()
+    # handles not released yet
+    live = 0
+    # handles released by the garbage collector instead of release()
+    leaked = 0
+
+    def __init__(self, sample, shape, dtype, writable=False):
+        """
+        Map the buffer of a sample.
+        Args:
+            sample: Gst.Sample pulled from an appsink
+            shape: shape of the numpy view
+            dtype: data type of the numpy view
+            writable: try to map the memory for writing, so that the
+                consumer can draw on it in place
+        """
+        self.sample = sample
+        self.buffer = sample.get_buffer()
+        self.pts = self.buffer.pts
+        self.memory = None
+        self.map_info = None
+        self.data = None
+
+        if writable and self.exclusive():
+            # The buffer itself is not writable while the sample holds it,
+            # but its memory is when nobody else uses the buffer
+            memory = self.buffer.peek_memory(0)
+            ok, map_info = memory.map(Gst.MapFlags.READ | Gst.MapFlags.WRITE)
+            if ok:
+                self.memory = memory
+                self.map_info = map_info
+
+        if self.map_info is None:
+            ok, map_info = self.buffer.map(Gst.MapFlags.READ)
+            if not ok:
+                print("[ERROR] Error mapping buffer from GST Pipeline")
+                return
+            self.map_info = map_info
+
+        self.data = np.ndarray(shape, dtype, self.map_info.data)
+        with FrameHandle.lock:
+            FrameHandle.live += 1
+
+    def exclusive(self):
+        """
+        Check if the buffer has a single memory and is only referenced by
+        the sample and this handle, e.g. not shared with another branch of
+        a tee.
+        """
+        if self.buffer.n_memory() != 1:
+            return False
+        try:
+            return self.buffer.mini_object.refcount <= 2
+        except AttributeError:
+            return False
+
+    @property
+    def writable(self):
+        """
+        True if data can be drawn on in place
+        """
+        return self.data is not None and self.data.flags.writeable
+
+    def release(self):
+        """
+        Unmap the buffer and drop the sample. data is not valid after this.
+        """
+        if self.data is None:
+            return
+        self.data = None
+        if self.memory is not None:
+            self.memory.unmap(self.map_info)
+        else:
+            self.buffer.unmap(self.map_info)
+        self.map_info = None
+        self.memory = None
+        self.buffer = None
+        self.sample = None
+        with FrameHandle.lock:
+            FrameHandle.live -= 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def __del__(self):
+        if self.data is not None:
+            with FrameHandle.lock:
+                FrameHandle.leaked += 1
+            self.release()
+
+class OutputBuffer:
+    """
+    Output buffer mapped for writing. data is a numpy view of the buffer
+    memory, the output is rendered into it and the buffer is pushed as is.
+    """
+
+    def __init__(self, buffer, shape, pooled):
+        """
+        Args:
+            buffer: writable Gst.Buffer
+            shape: shape of the numpy view
+            pooled: False if the buffer was allocated because the pool was
+                exhausted
+        """
+        self.buffer = buffer
+        self.pooled = pooled
+        self.data = None
+        ok, self.map_info = buffer.map(Gst.MapFlags.WRITE)
+        if ok:
+            self.data = np.ndarray(shape, np.uint8, self.map_info.data)
+
+    def unmap(self):
+        """
+        Unmap the buffer before it is pushed. data is not valid after this.
+        """
+        if self.data is not None:
+            self.data = None
+            self.buffer.unmap(self.map_info)
+
+
+class OutputPool:
+    """
+    Pool of preallocated output buffers. The output is rendered directly
+    into an acquired buffer, which is pushed without copying and goes back
+    to the pool when GStreamer releases it. When all buffers are still in
+    use downstream a new buffer is allocated instead of waiting.
+    """
+
+    def __init__(self, width, height, size=4):
+        """
+        Args:
+            width: width of the output frames
+            height: height of the output frames
+            size: number of buffers in the pool
+        """
+        self.shape = (height, width, 3)
+        self.frame_size = height * width * 3
+        self.pool = Gst.BufferPool.new()
+        config = self.pool.get_config()
+        Gst.BufferPool.config_set_params(config, None, self.frame_size, size, size)
+        self.pool.set_config(config)
+        self.pool.set_active(True)
+        self.params = Gst.BufferPoolAcquireParams()
+        self.params.flags = Gst.BufferPoolAcquireFlags.DONTWAIT
+
+    def acquire(self):
+        """
+        Get a mapped output buffer
+        Returns:
+            OutputBuffer, its pooled flag is False if the pool was exhausted
+        """
+        ret, buffer = self.pool.acquire_buffer(self.params)
+        if ret == Gst.FlowReturn.OK:
+            output = OutputBuffer(buffer, self.shape, True)
+            if output.data is not None:
+                return output
+        buffer = Gst.Buffer.new_allocate(None, self.frame_size, None)
+        return OutputBuffer(buffer, self.shape, False)
+
+    def free(self):
+        """
+        Deactivate the pool, buffers still in use are freed when released
+        """
+        self.pool.set_active(False)
+
+
 class GstPipe:
     """
     Class to handle gstreamer pipeline related things
@@ -34,6 +217,9 @@ class GstPipe:
         self.src_pipe = src_pipe
         self.sink_pipe = sink_pipe
         self.mutex = Lock()
+        # mailboxes fed by appsink callbacks, by flow id
+        self.mailboxes = {}
+        self.mailbox_flows = {}
 
     def start(self):
         """
@@ -77,13 +263,82 @@ class GstPipe:
         sink.set_caps(caps)
         return sink
 
-    def pull_frame(self, src, loop):
+    def attach_mailbox(self, src, mailbox, flow_id):
         """
-        Pull a frame from gst pipeline
+        Deliver the samples of an appsink to a mailbox from its new-sample
+        callback, instead of pulling them
         Args:
-            src: gst src element from which the frame is pulled
+            src: gst appsink element
+            mailbox: delivery.Mailbox receiving the samples
+            flow_id: id of the flow the appsink belongs to
+        """
+        self.mailboxes.setdefault(flow_id, []).append(mailbox)
+        self.mailbox_flows[mailbox] = flow_id
+        src.set_property("emit-signals", True)
+        src.connect("new-sample", self.on_new_sample, mailbox)
+        src.connect("eos", self.on_eos, mailbox)
+
+    def on_new_sample(self, src, mailbox):
+        """
+        new-sample callback of the appsinks attached to a mailbox
+        """
+        sample = src.pull_sample()
+        if sample is not None:
+            mailbox.put(sample)
+        return Gst.FlowReturn.OK
+
+    def on_eos(self, src, mailbox):
+        """
+        eos callback of the appsinks attached to a mailbox
+        """
+        mailbox.set_eos()
+
+    def pull_mailbox(self, src, loop, name, mailbox):
+        """
+        Get a sample delivered to a mailbox by attach_mailbox
+        Args:
+            src: gst appsink element attached to the mailbox
             loop: If src need to be looped after eos
+            name: what is pulled, used in the error message
+            mailbox: delivery.Mailbox of src
         """
+        sample = mailbox.wait()
+        if sample is delivery.EOS:
+            if not loop:
+                return None
+            # Seek can be called from various sources hence putting lock
+            with self.mutex:
+                # another appsink of the flow may have seeked already
+                if mailbox.eos:
+                    # the streaming threads may be blocked in a full mailbox,
+                    # release them before the flush waits for them
+                    flow_mailboxes = self.mailboxes[self.mailbox_flows[mailbox]]
+                    for m in flow_mailboxes:
+                        m.start_flush()
+                    src.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH, 0)
+                    for m in flow_mailboxes:
+                        m.stop_flush()
+            sample = mailbox.wait()
+        if sample is None and mailbox.closed:
+            # the pipe is stopping
+            return None
+        if sample is None or sample is delivery.EOS:
+            print("[ERROR] Error pulling %s from GST Pipeline" % name)
+            return None
+        return sample
+
+    def pull_sample(self, src, loop, name="frame", mailbox=None):
+        """
+        Pull a sample from gst pipeline
+        Args:
+            src: gst src element from which the sample is pulled
+            loop: If src need to be looped after eos
+            name: what is pulled, used in the error message
+            mailbox: get the sample from this mailbox instead of pulling it
+        """
+        if mailbox is not None:
+            return self.pull_mailbox(src, loop, name, mailbox)
+
         sample = src.try_pull_sample(5000000000)
         if type(sample) != Gst.Sample:
             if src.is_eos():
@@ -95,22 +350,36 @@ class GstPipe:
                 else:
                     return None
             else:
-                print("[ERROR] Error pulling frame from GST Pipeline")
+                print("[ERROR] Error pulling %s from GST Pipeline" % name)
                 return None
+        return sample
+
+    def pull_frame(self, src, loop, writable=False, mailbox=None):
+        """
+        Pull a frame from gst pipeline
+        Args:
+            src: gst src element from which the frame is pulled
+            loop: If src need to be looped after eos
+            writable: map the frame for drawing in place if possible
+            mailbox: get the frame from this mailbox instead of pulling it
+        Returns:
+            FrameHandle, to be released once the frame is not used anymore
+        """
+        sample = self.pull_sample(src, loop, "frame", mailbox)
+        if sample is None:
+            return None
         caps = sample.get_caps()
 
         struct = caps.get_structure(0)
         width = struct.get_value("width")
         height = struct.get_value("height")
 
-        buffer = sample.get_buffer()
-        _, map_info = buffer.map(Gst.MapFlags.READ)
-        frame = np.ndarray((height, width, 3), np.uint8, map_info.data)
-        buffer.unmap(map_info)
-
-        return frame
+        handle = FrameHandle(sample, (height, width, 3), np.uint8, writable)
+        if handle.data is None:
+            return None
+        return handle
 
-    def pull_tensor(self, src, loop, width, height, layout, data_type):
+    def pull_tensor(self, src, loop, width, height, layout, data_type, mailbox=None):
         """
         Pull a frame from gst pipeline
         Args:
@@ -120,29 +389,22 @@ class GstPipe:
             height: height of the tensor
             layout: data layout (NHWC or NCHW)
             data_type: data type of the tensor
+            mailbox: get the tensor from this mailbox instead of pulling it
+        Returns:
+            FrameHandle, to be released once the tensor is not used anymore
         """
-        sample = src.try_pull_sample(5000000000)
-        if type(sample) != Gst.Sample:
-            if src.is_eos():
-                if loop:
-                    # Seek can be called from various sources hence putting lock
-                    with self.mutex:
-                        src.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH, 0)
-                        sample = src.try_pull_sample(5000000000)
-                else:
-                    return None
-            else:
-                print("[ERROR] Error pulling tensor from GST Pipeline")
-                return None
-        buffer = sample.get_buffer()
-        _, map_info = buffer.map(Gst.MapFlags.READ)
+        sample = self.pull_sample(src, loop, "tensor", mailbox)
+        if sample is None:
+            return None
         if layout == "NHWC":
-            frame = np.ndarray((1, height, width, 3), data_type, map_info.data)
+            shape = (1, height, width, 3)
         elif layout == "NCHW":
-            frame = np.ndarray((1, 3, height, width), data_type, map_info.data)
-        buffer.unmap(map_info)
+            shape = (1, 3, height, width)
 
-        return frame
+        handle = FrameHandle(sample, shape, data_type)
+        if handle.data is None:
+            return None
+        return handle
 
     def push_frame(self, frame, sink):
         """
@@ -154,6 +416,17 @@ class GstPipe:
         buffer = Gst.Buffer.new_wrapped(frame.tobytes())
         sink.push_buffer(buffer)
 
+    def push_output(self, output, sink):
+        """
+        Push an output buffer rendered in place, without copying it
+        Args:
+            output: OutputBuffer from OutputPool.acquire
+            sink: gst sink element to which the buffer is pushed
+        """
+        output.unmap()
+        sink.push_buffer(output.buffer)
+        output.buffer = None
+
     def send_eos(self, sink):
         """
         Send EOS singnal to the sink
@@ -234,9 +507,64 @@ def get_caps(element, pad_name):
     return caps
 
 
+_caps_cache = None
+
+
+def get_caps_cache():
+    """
+    Returns the CapsCache of the process. It is loaded from a file named
+    after the SOC and the GStreamer registry unless --no-caps-cache is given.
+    """
+    global _caps_cache
+    if _caps_cache is None:
+        path = None
+        args = getattr(utils, "args", None)
+        if not (args and args.no_caps_cache):
+            plugins = [
+                (p.get_name(), str(p.get_version()), str(p.get_filename()))
+                for p in Gst.Registry.get().get_plugin_list()
+            ]
+            fingerprint = caps_cache.registry_fingerprint(
+                Gst.version_string(), plugins
+            )
+            path = os.path.join(
+                caps_cache.default_dir(),
+                "caps_%s_%s.json" % (SOC if SOC else "arm", fingerprint),
+            )
+        _caps_cache = caps_cache.CapsCache(path)
+    return _caps_cache
+
+
 def get_pad_info(element_factory, pad_name, info_type):
     """
-    Returns info about a pad
+    Returns info about a pad, cached per factory
+    Args:
+        element_factory: GstElementFactory
+        pad_name: GstPad
+        info_type: "caps" or "presence"
+    """
+    if info_type == "caps":
+        to_json = lambda caps: caps.to_string()
+        from_json = Gst.Caps.from_string
+    elif info_type == "presence":
+        to_json = int
+        from_json = Gst.PadPresence
+    else:
+        return None
+
+    def probe():
+        info = probe_pad_info(element_factory, pad_name, info_type)
+        return None if info is None else to_json(info)
+
+    info = get_caps_cache().get(
+        info_type, element_factory.get_name(), pad_name, probe
+    )
+    return None if info is None else from_json(info)
+
+
+def probe_pad_info(element_factory, pad_name, info_type):
+    """
+    Returns info about a pad from the pad templates of the factory
     Args:
         element_factory: GstElementFactory
         pad_name: GstPad
@@ -262,13 +590,44 @@ def get_pad_info(element_factory, pad_name, info_type):
 
 def get_pad_format(element_factory, pad_name):
     """
-    Returns list of format supported by pad of an element
+    Returns list of format supported by pad of an element, cached per factory
+    Args:
+        element_factory: GstElementFactory
+        pad_name: GstPad
+    """
+    return get_caps_cache().get(
+        "format",
+        element_factory.get_name(),
+        pad_name,
+        lambda: probe_pad_format(element_factory, pad_name),
+    )
+
+
+def get_factory_format(factory_name, pad_name):
+    """
+    Same as get_pad_format, the factory is only looked up if the formats
+    are not cached
+    Args:
+        factory_name: name of the element factory
+        pad_name: GstPad
+    """
+    return get_caps_cache().get(
+        "format",
+        factory_name,
+        pad_name,
+        lambda: probe_pad_format(Gst.ElementFactory.find(factory_name), pad_name),
+    )
+
+
+def probe_pad_format(element_factory, pad_name):
+    """
+    Returns list of format supported by pad of an element, 1 for any
     Args:
         element_factory: GstElementFactory
         pad_name: GstPad
     """
     data = []
-    caps = get_pad_info(element_factory, pad_name, "caps")
+    caps = probe_pad_info(element_factory, pad_name, "caps")
     if caps.is_any():
         return 1
     prop_list = caps.get_structure(0).get_list("format").array
@@ -279,7 +638,19 @@ def get_pad_format(element_factory, pad_name):
 
 def get_num_pads(element_name, pad_name):
     """
-    Returns number of pads of an element
+    Returns number of pads of an element, cached per factory
+    Args:
+        element_name: factory name of gst element
+        pad_name: GstPad
+    """
+    return get_caps_cache().get(
+        "pads", element_name, pad_name, lambda: probe_num_pads(element_name, pad_name)
+    )
+
+
+def probe_num_pads(element_name, pad_name):
+    """
+    Returns number of pads of a newly made element
     Args:
         element_name: factory name of gst element
         pad_name: GstPad
@@ -1221,24 +1592,19 @@ def get_color_convert_config(input_format, output_format):
         "GRAY8": ["NV12"]
     }
 
-    dl_color_convert_element_factory = Gst.ElementFactory.find(
-        gst_element_map["dlcolorconvert"]["element"]
-    )
-    color_convert_element_factory = Gst.ElementFactory.find(
-        gst_element_map["colorconvert"]["element"]
-    )
-    video_convert_element_factory = Gst.ElementFactory.find("videoconvert")
+    dl_color_convert_element_name = gst_element_map["dlcolorconvert"]["element"]
+    color_convert_element_name = gst_element_map["colorconvert"]["element"]
 
-    dlcc_sink_list = get_pad_format(dl_color_convert_element_factory, "sink")
-    cc_sink_list = get_pad_format(color_convert_element_factory, "sink")
-    vc_sink_list = get_pad_format(video_convert_element_factory, "sink")
+    dlcc_sink_list = get_factory_format(dl_color_convert_element_name, "sink")
+    cc_sink_list = get_factory_format(color_convert_element_name, "sink")
+    vc_sink_list = get_factory_format("videoconvert", "sink")
 
-    dlcc_src_list = get_pad_format(dl_color_convert_element_factory, "src")
-    cc_src_list = get_pad_format(color_convert_element_factory, "src")
-    vc_src_list = get_pad_format(video_convert_element_factory, "src")
+    dlcc_src_list = get_factory_format(dl_color_convert_element_name, "src")
+    cc_src_list = get_factory_format(color_convert_element_name, "src")
+    vc_src_list = get_factory_format("videoconvert", "src")
 
     if input_format in dlcc_sink_list and output_format in dlcc_src_list:
-        if dl_color_convert_element_factory.get_name() == "tiovxdlcolorconvert":
+        if dl_color_convert_element_name == "tiovxdlcolorconvert":
             # Check combination
             if output_format.upper() in tiovxdlcc_combimations[input_format.upper()]:
                 return gst_element_map["dlcolorconvert"]
@@ -1271,22 +1637,17 @@ def get_gst_pipe(flows, outputs):
         outputs: List of outputs
     """
 
-    scaler_element_factory = Gst.ElementFactory.find(
-        gst_element_map["scaler"]["element"]
+    scaler_format_list = get_factory_format(
+        gst_element_map["scaler"]["element"], "sink"
     )
-    scaler_format_list = get_pad_format(scaler_element_factory, "sink")
 
-    dl_color_convert_element_factory = Gst.ElementFactory.find(
-        gst_element_map["dlcolorconvert"]["element"]
-    )
-    dl_color_convert_format_list = get_pad_format(
-        dl_color_convert_element_factory, "sink"
+    dl_color_convert_format_list = get_factory_format(
+        gst_element_map["dlcolorconvert"]["element"], "sink"
     )
 
-    color_convert_element_factory = Gst.ElementFactory.find(
-        gst_element_map["colorconvert"]["element"]
+    color_convert_format_list = get_factory_format(
+        gst_element_map["colorconvert"]["element"], "sink"
     )
-    color_convert_format_list = get_pad_format(color_convert_element_factory, "sink")
 
     src_players = []
     sink_player = None
@@ -1662,4 +2023,7 @@ def get_gst_pipe(flows, outputs):
 
                     sink_player = add_and_link(o.gst_disp_elements, player=sink_player)
                     link_elements(s.gst_post_proc_elements[-1], o.gst_disp_elements[0])
+    # Next runs skip the probing done while building the pipelines
+    get_caps_cache().save()
+
     return src_players, sink_player
@@ -29,111 +29,538 @@
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 from typing import Callable, Optional, Sequence, Tuple
 
+import os
+import sys
+import threading
 import numpy as np
 import cv2
 import math
+from time import time, sleep
 
-from norfair.tracker import TrackedObject
-from norfair import Detection
+
+# Header of a persisted heatmap file, followed by the float32 accumulator
+# at HEADER_SIZE bytes
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S4"),
+        ("version", "<u4"),
+        ("rows", "<u4"),
+        ("cols", "<u4"),
+        ("cell_size", "<u4"),
+        ("frame_height", "<u4"),
+        ("frame_width", "<u4"),
+        ("radius", "<u4"),
+        ("mode", "S16"),
+        ("created", "<f8"),
+        ("updated", "<f8"),
+        ("decay_origin", "<f8"),
+    ]
+)
+HEADER_MAGIC = b"HMAP"
+HEADER_VERSION = 1
+HEADER_SIZE = 128
+
+
+def open_heatmap(path):
+    """
+    Open a persisted heatmap read-only, e.g. for offline reports. The
+    accumulator is mapped, not loaded.
+    Args:
+        path: heatmap file written by HeatMap.attach
+    Returns:
+        HeatMap drawing the stored accumulator
+    """
+    header = np.memmap(path, HEADER_DTYPE, "r", shape=(1,))[0]
+    if header["magic"] != HEADER_MAGIC or header["version"] != HEADER_VERSION:
+        print("[ERROR] %s is not a heatmap file." % path)
+        sys.exit()
+    heatmap = HeatMap(
+        (int(header["frame_height"]), int(header["frame_width"])),
+        int(header["radius"]),
+        int(header["cell_size"]),
+        mode=header["mode"].decode(),
+    )
+    heatmap.impulses = np.memmap(
+        path, np.float32, "r", offset=HEADER_SIZE, shape=heatmap.map_shape
+    )
+    heatmap.header = header
+    heatmap.dirty_tiles[:] = True
+    return heatmap
 
 
 class HeatMap:
     """
     Generate heatmap based on history of all detected objects.
+
+    Modes:
+        cumulative: all detections since start count the same
+        decay: the weight of a detection halves every half_life seconds
+        window: only detections of the last window seconds count
     """
+
+    # Size of the tiles tracked for incremental rendering in grid cells
+    TILE_SIZE = 16
+
+    # Relative change of the normalization range below which the cached
+    # normalization and equalization are reused
+    RANGE_TOLERANCE = 0.05
+
+    # Decay weights are folded back into the map once they reach this value
+    DECAY_FOLD = 1e4
+
+    # JET color map of all gray levels, in RGB order
+    COLOR_LUT = cv2.cvtColor(
+        cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(1, 256), cv2.COLORMAP_JET),
+        cv2.COLOR_RGB2BGR,
+    )
     
     def __init__(
                 self,
                 shape,
                 radius: Optional[int] = 10,
+                cell_size: Optional[int] = 8,
+                mode: Optional[str] = "cumulative",
+                half_life: Optional[float] = 3600,
+                window: Optional[float] = 900,
+                buckets: Optional[int] = 15,
+                report=None,
         ):
+        """
+        Args:
+            shape: (height, width) of the frames in pixels
+            radius: radius of the circle added for each object in pixels
+            cell_size: size of the square grid cells of the map in pixels
+            mode: "cumulative", "decay" or "window"
+            half_life: half-life of a detection in seconds for the decay mode
+            window: length of the window in seconds for the window mode
+            buckets: number of time buckets the window is made of
+            report: utils.Report used for the rendering statistics
+        """
         self.radius = radius
-        self.map_shape = shape
-        self.map = np.zeros(self.map_shape)
-        self.map_gray = np.zeros((self.map_shape[0],self.map_shape[1],1), np.uint8)
-        self.map_color = np.zeros((self.map_shape[0],self.map_shape[1],3), np.uint8)
+        self.cell_size = cell_size
+        self.frame_shape = shape
+        # The map is accumulated on a grid of cell_size x cell_size px cells
+        self.map_shape = (
+            -(-shape[0] // cell_size),
+            -(-shape[1] // cell_size),
+        )
+        # Object centers are accumulated as impulses and spread with the
+        # circle kernel only when the map is drawn
+        self.impulses = np.zeros(self.map_shape, np.float32)
+        self.map = np.zeros(self.map_shape, np.float32)
+        self.report = report
+        self.header = None  # header of the persisted file, see attach
+        self.pyramid = None  # HeatMapPyramid for time range queries
+        self.pyramid_range = None  # seconds drawn from the pyramid by draw
+        self.range_map = None  # HeatMap drawing the pyramid queries
+
+        self.mode = mode
+        if mode == "decay":
+            # New detections get the weight exp(rate * (t - origin)) instead
+            # of scaling the whole map down on every frame. Normalization
+            # is scale invariant, so the map is drawn without rescaling.
+            self.decay_rate = math.log(2) / half_life
+            self.decay_origin = time()
+        elif mode == "window":
+            # Ring of time buckets, impulses holds their running sum
+            self.bucket_span = window / buckets
+            self.buckets = np.zeros((buckets,) + self.map_shape, np.float32)
+            self.bucket_index = int(time() // self.bucket_span)
+
+        # Map regions are tracked in tiles of TILE_SIZE x TILE_SIZE cells
+        self.tiles_shape = (
+            -(-self.map_shape[0] // HeatMap.TILE_SIZE),
+            -(-self.map_shape[1] // HeatMap.TILE_SIZE),
+        )
+        self.dirty_tiles = np.zeros(self.tiles_shape, bool)
+
+        # Cached rendering state
+        self.map_gray = np.zeros(self.map_shape, np.uint8)
+        self.map_color = None  # color layer at the last output size
+        self.norm_range = (0.0, 0.0)  # min and max used to normalize
+        self.lut = np.arange(256, dtype=np.uint8)  # histogram equalization
+        self.draw_count = 0
+        self.draw_hits = 0
 
-        # create gradient filled circel 
+        # create gradient filled circel with the radius in grid cells
+        radius = max(1, round(radius / cell_size))
             # create circel
-        self.circle_img = np.zeros((self.radius*2, self.radius*2))
+        self.circle_img = np.zeros((radius*2, radius*2))
             # draw circel with solid fill
         self.circle_img = cv2.circle(self.circle_img, (radius-1, radius-1), radius, 1, -1)
             # create gradient mask
-        gradient_mask = np.zeros((self.radius*2, self.radius*2))
-        for row in range(0, self.radius*2):
-            for col in range(0, self.radius*2):
-                current_point = (col,row)
-                gradient_mask[row, col] = math.sqrt((self.radius - col)**2 + (self.radius - row)**2)
+        rows, cols = np.indices((radius*2, radius*2))
+        gradient_mask = np.sqrt((radius - cols)**2 + (radius - rows)**2)
 
         gradient_mask = gradient_mask.max() - gradient_mask
 
         # multiply solid fill circel with gradient mask
         self.circle_img = self.circle_img * gradient_mask
 
-        self.circle_img = cv2.normalize(self.circle_img,None, 0, 1, cv2.NORM_MINMAX)
+        self.circle_img = cv2.normalize(self.circle_img,None, 0, 1, cv2.NORM_MINMAX).astype(np.float32)
 
+        # filter2D correlates, flip the kernel to splat it around each center
+        self.kernel = cv2.flip(self.circle_img, -1)
+        self.anchor = (radius - 1, radius - 1)
+        self.kernel_radius = radius
+
+    def attach(self, path, flush_interval=60):
+        """
+        Keep the accumulator in a memory-mapped file. An existing file is
+        reattached as it is, otherwise a new one is created. The file is
+        flushed every flush_interval seconds on a separate thread.
+        Args:
+            path: heatmap file
+            flush_interval: seconds between flushes
+        """
+        if self.mode == "window":
+            print("[ERROR] The window heatmap mode can not be persisted.")
+            sys.exit()
+
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.truncate(HEADER_SIZE + self.impulses.nbytes)
+            header = np.memmap(path, HEADER_DTYPE, "r+", shape=(1,))
+            header["magic"] = HEADER_MAGIC
+            header["version"] = HEADER_VERSION
+            header["rows"], header["cols"] = self.map_shape
+            header["cell_size"] = self.cell_size
+            header["frame_height"], header["frame_width"] = self.frame_shape
+            header["radius"] = self.radius
+            header["mode"] = self.mode.encode()
+            header["created"] = header["updated"] = time()
+            header["decay_origin"] = getattr(self, "decay_origin", 0)
+            header.flush()
+
+        self.header = np.memmap(path, HEADER_DTYPE, "r+", shape=(1,))[0]
+        if (
+            self.header["magic"] != HEADER_MAGIC
+            or self.header["version"] != HEADER_VERSION
+            or (self.header["rows"], self.header["cols"]) != self.map_shape
+            or self.header["cell_size"] != self.cell_size
+            or self.header["mode"].decode() != self.mode
+        ):
+            print(
+                "[ERROR] Heatmap file %s does not match the heatmap configuration." % path
+            )
+            sys.exit()
+
+        self.impulses = np.memmap(
+            path, np.float32, "r+", offset=HEADER_SIZE, shape=self.map_shape
+        )
+        if self.mode == "decay":
+            self.decay_origin = float(self.header["decay_origin"])
+        self.dirty_tiles[:] = True
+
+        self.flush_thread = threading.Thread(
+            target=self.flush_loop, args=(flush_interval,), daemon=True
+        )
+        self.flush_thread.start()
+
+    def flush_loop(self, flush_interval):
+        """
+        Callback function for the flush thread
+        """
+        while True:
+            sleep(flush_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Write the persisted accumulator and header to the file
+        """
+        self.header["updated"] = time()
+        self.impulses.flush()
+        self.header.base.flush()
 
     def update(self, objects):
-        for obj in objects:
-
-            x_circ1 = 0
-            y_circ1 = 0
-
-            x_circ2 = self.radius*2 - 1
-            y_circ2 = self.radius*2 - 1
-
-            if type(obj) == TrackedObject:
-                point_center = tuple(np.mean(np.array(obj.estimate), axis=0).astype(int))
-            elif type(obj) ==  Detection:
-                point_center = tuple(np.mean(np.array(obj.points), axis=0).astype(int))
-            else:
-                return
-
-            # point_cetner = point_center.astype(int)
-            point_center = point_center[::-1]
-            if point_center[0] >= self.map_shape[0] or point_center[0] < 0:
-                print("return vertical")
-                return
-            if point_center[1] >= self.map_shape[1] or point_center[1] < 0:
-                print("return horizontal")
-                return
-            
-            # tuple(point.astype(int)),
-            x_map1 = point_center[0] - self.radius
-            y_map1 = point_center[1] - self.radius
-
-            x_map2 = point_center[0] + self.radius -1
-            y_map2 = point_center[1] + self.radius -1
-
-            if x_map1 < 0:
-                x_circ1 = abs(x_map1)
-                x_map1 = 0
-            elif x_map2 >= self.map_shape[0]:
-                x_circ2 = x_circ2 - (x_map2 - self.map_shape[0]) -1
-                x_map2 = self.map_shape[0] -1
-
-            if y_map1 < 0:
-                y_circ1 = abs(y_map1)
-                y_map1 = 0
-            elif y_map2 >= self.map_shape[1]:
-                y_circ2 = y_circ2 - (y_map2 - self.map_shape[1]) -1
-                y_map2 = self.map_shape[1] -1
-
-            self.map[x_map1:x_map2, y_map1:y_map2] = self.map[x_map1:x_map2, y_map1:y_map2] + self.circle_img[x_circ1:x_circ2, y_circ1:y_circ2]
-
-        # apply color map
+        """
+        Add the centers of the objects to the heatmap.
+        Args:
+            objects: (N, 2, 2) array of boxes or list of TrackedObject / Detection
+        """
+        if type(objects) != np.ndarray:
+            objects = np.array(
+                [
+                    obj.estimate if hasattr(obj, "estimate") else obj.points
+                    for obj in objects
+                ],
+                np.float32,
+            )
+        if len(objects) == 0:
+            return
+        self.update_centers(objects.reshape(-1, 2, 2).mean(axis=1))
+
+    def update_centers(self, centers, now=None):
+        """
+        Add points to the heatmap. Points outside the frame are dropped.
+        Args:
+            centers: (N, 2) array of [X Y] points in pixels
+            now: time of the points, current time by default
+        """
+        if now is None:
+            now = time()
+        centers = np.asarray(centers).astype(np.intp)
+        x = centers[:, 0]
+        y = centers[:, 1]
+        inside = (x >= 0) & (x < self.frame_shape[1]) & (y >= 0) & (y < self.frame_shape[0])
+        row = y[inside] // self.cell_size
+        col = x[inside] // self.cell_size
+
+        if self.pyramid is not None:
+            self.pyramid.add(x[inside], y[inside], now)
+
+        if self.mode == "decay":
+            np.add.at(self.impulses, (row, col), self.decay_weight(now))
+        elif self.mode == "window":
+            self.advance(now)
+            np.add.at(self.buckets[self.bucket_index % len(self.buckets)], (row, col), 1)
+            np.add.at(self.impulses, (row, col), 1)
+        else:
+            np.add.at(self.impulses, (row, col), 1)
+
+        self.mark_dirty(row, col)
+
+    def decay_weight(self, now):
+        """
+        Weight of a detection at time now in the decay mode. Once the
+        weight grows large the map is scaled down and the origin moved.
+        """
+        exponent = self.decay_rate * (now - self.decay_origin)
+        if exponent > math.log(HeatMap.DECAY_FOLD):
+            # Checked before exp, which overflows after a long idle time or
+            # when a persisted map is reloaded. The scale then underflows to
+            # zero, i.e. the old detections have decayed away.
+            scale = math.exp(-exponent)
+            # scaling keeps the cached normalization and colors valid
+            self.impulses *= scale
+            self.map *= scale
+            low, high = self.norm_range
+            self.norm_range = (low * scale, high * scale)
+            self.decay_origin = now
+            if self.header is not None:
+                self.header["decay_origin"] = now
+            return 1.0
+        return math.exp(exponent)
+
+    def advance(self, now):
+        """
+        Drop the time buckets which left the window in the window mode
+        """
+        index = int(now // self.bucket_span)
+        if index <= self.bucket_index:
+            return
+        count = len(self.buckets)
+        for i in range(self.bucket_index + 1, min(index, self.bucket_index + count) + 1):
+            bucket = self.buckets[i % count]
+            row, col = np.nonzero(bucket)
+            if len(row):
+                self.impulses -= bucket
+                bucket[:] = 0
+                self.mark_dirty(row, col)
+        self.bucket_index = index
+
+    def mark_dirty(self, row, col):
+        """
+        Mark the tiles changed by impulses in the given cells
+        """
+        if len(row) == 0:
+            return
+        # each point changes the tiles covered by its kernel, usually the
+        # 2x2 tiles around its corners, more with small cells
+        r = self.kernel_radius
+        tile = HeatMap.TILE_SIZE
+        row0 = np.clip(row - r, 0, None) // tile
+        row1 = np.minimum(row + r, self.map_shape[0] - 1) // tile
+        col0 = np.clip(col - r, 0, None) // tile
+        col1 = np.minimum(col + r, self.map_shape[1] - 1) // tile
+        for dr in range(int((row1 - row0).max()) + 1):
+            for dc in range(int((col1 - col0).max()) + 1):
+                self.dirty_tiles[np.minimum(row0 + dr, row1), np.minimum(col0 + dc, col1)] = True
+
+    def tile_slices(self, tile_row, tile_col, pad=0):
+        """
+        Slices of the map covered by a tile, optionally padded
+        """
+        tile = HeatMap.TILE_SIZE
+        y0 = max(0, tile_row * tile - pad)
+        x0 = max(0, tile_col * tile - pad)
+        y1 = min(self.map_shape[0], (tile_row + 1) * tile + pad)
+        x1 = min(self.map_shape[1], (tile_col + 1) * tile + pad)
+        return slice(y0, y1), slice(x0, x1)
+
+    def spread(self, impulses):
+        """
+        Spread impulses with the circle kernel
+        """
+        return cv2.filter2D(
+            impulses, -1, self.kernel, anchor=self.anchor, borderType=cv2.BORDER_CONSTANT
+        )
+
+    def accumulate(self, tiles=None):
+        """
+        Spread the accumulated impulses with the circle kernel
+        Args:
+            tiles: (rows, cols) of the tiles to recompute, None for the whole map
+        Returns:
+            the heatmap on the grid as float32 array
+        """
+        if tiles is None:
+            self.map = self.spread(self.impulses)
+            self.dirty_tiles[:] = False
+            return self.map
+
+        pad = 2 * self.kernel_radius
+        tile = HeatMap.TILE_SIZE
+        for tile_row, tile_col in zip(*tiles):
+            rows, cols = self.tile_slices(tile_row, tile_col, pad)
+            spread = self.spread(self.impulses[rows, cols])
+            inner_rows, inner_cols = self.tile_slices(tile_row, tile_col)
+            self.map[inner_rows, inner_cols] = spread[
+                inner_rows.start - rows.start : inner_rows.stop - rows.start,
+                inner_cols.start - cols.start : inner_cols.stop - cols.start,
+            ]
+        self.dirty_tiles[tiles] = False
+        return self.map
+
+    def normalize(self, values):
+        """
+        Scale map values to gray levels with the cached normalization range
+        """
+        low, high = self.norm_range
+        if high <= low:
+            return np.zeros(values.shape, np.uint8)
+        gray = (values - low) * (255.0 / (high - low))
+        return np.clip(gray, 0, 255).astype(np.uint8)
+
+    def equalize_lut(self, gray):
+        """
+        Lookup table equalizing the histogram of gray, as cv2.equalizeHist
+        """
+        hist = np.bincount(gray.ravel(), minlength=256)
+        cdf = hist.cumsum()
+        cdf_min = cdf[np.flatnonzero(hist)[0]]
+        if cdf[-1] == cdf_min:
+            return np.arange(256, dtype=np.uint8)
+        lut = np.round((cdf - cdf_min) * (255.0 / (cdf[-1] - cdf_min)))
+        return np.clip(lut, 0, 255).astype(np.uint8)
+
+    def colorize(self, gray):
+        """
+        Apply the color map with the lookup table computed once
+        """
+        return cv2.LUT(cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB), HeatMap.COLOR_LUT)
+
+    def render_full(self, reseize):
+        """
+        Recompute the whole color layer
+        """
+        heatmap = self.accumulate()
+        self.norm_range = (float(heatmap.min()), float(heatmap.max()))
+        gray = self.normalize(heatmap)
+        self.lut = self.equalize_lut(gray)
+        self.map_gray = self.lut[gray]
+
+        # upsample and apply color map only at the output resolution
+        map_gray = cv2.resize(self.map_gray, reseize, interpolation=cv2.INTER_LINEAR)
+        self.map_color = self.colorize(map_gray)
+
+    def render_tiles(self, tiles, reseize):
+        """
+        Update the cached color layer in the given tiles only
+        """
+        for tile_row, tile_col in zip(*tiles):
+            rows, cols = self.tile_slices(tile_row, tile_col)
+            self.map_gray[rows, cols] = self.lut[self.normalize(self.map[rows, cols])]
+
+        map_gray = cv2.resize(self.map_gray, reseize, interpolation=cv2.INTER_LINEAR)
+
+        # color map the tiles, grown by one cell for the interpolation
+        scale_x = reseize[0] / self.map_shape[1]
+        scale_y = reseize[1] / self.map_shape[0]
+        for tile_row, tile_col in zip(*tiles):
+            rows, cols = self.tile_slices(tile_row, tile_col, pad=1)
+            out_rows = slice(int(rows.start * scale_y), int(math.ceil(rows.stop * scale_y)))
+            out_cols = slice(int(cols.start * scale_x), int(math.ceil(cols.stop * scale_x)))
+            self.map_color[out_rows, out_cols] = self.colorize(map_gray[out_rows, out_cols])
+
+    def render(self, reseize):
+        """
+        Bring the color layer up to date, reusing the cached layer where
+        possible
+        Returns:
+            "full", "incremental" or "cached"
+        """
+        if self.mode == "window":
+            self.advance(time())
+
+        if self.map_color is None or self.map_color.shape[1::-1] != tuple(reseize):
+            self.render_full(reseize)
+            return "full"
+
+        tiles = np.nonzero(self.dirty_tiles)
+        if len(tiles[0]) == 0:
+            return "cached"
+        if len(tiles[0]) > self.dirty_tiles.size // 2:
+            self.render_full(reseize)
+            return "full"
+
+        heatmap = self.accumulate(tiles)
+        low, high = self.norm_range
+        tolerance = HeatMap.RANGE_TOLERANCE * (high - low)
+        if abs(heatmap.min() - low) > tolerance or abs(heatmap.max() - high) > tolerance:
+            self.render_full(reseize)
+            return "full"
+
+        self.render_tiles(tiles, reseize)
+        return "incremental"
+
+    def draw_range(self, frame, reseize, start, end):
+        """
+        Draw the heatmap of a time range over the frame
+        Args:
+            frame: background frame
+            reseize: (width, height) of the output image
+            start: start time in seconds since the epoch
+            end: end time in seconds since the epoch
+        Returns:
+            RGB image of size reseize
+        """
+        if self.range_map is None:
+            self.range_map = HeatMap(
+                self.frame_shape, self.radius, self.pyramid.cell_size, report=self.report
+            )
+        self.range_map.impulses, _ = self.pyramid.query(start, end)
+        self.range_map.dirty_tiles[:] = True
+        return self.range_map.draw(frame, reseize)
+
     def draw(self, frame, reseize):
+        """
+        Draw the heatmap over the frame
+        Args:
+            frame: background frame
+            reseize: (width, height) of the output image
+        Returns:
+            RGB image of size reseize
+        """
+        if self.pyramid is not None and self.pyramid_range:
+            now = time()
+            return self.draw_range(frame, reseize, now - self.pyramid_range, now)
 
-        self.map_gray  = cv2.normalize(self.map,None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        start = time()
+        mode = self.render(reseize)
+        end = time()
 
-        self.map_gray = cv2.equalizeHist(self.map_gray)
+        self.draw_count += 1
+        if mode != "full":
+            self.draw_hits += 1
+        if self.report:
+            self.report.report_proctime("heatmap-" + mode, (end - start))
+            self.report.report_metric(
+                "heatmap hit rate", 100.0 * self.draw_hits / self.draw_count, "%"
+            )
 
-        self.map_color = cv2.cvtColor(cv2.applyColorMap(self.map_gray.astype(np.uint8), cv2.COLORMAP_JET), cv2.COLOR_RGB2BGR)
-        self.map_color = cv2.addWeighted(src1=frame, src2=self.map_color, alpha=0.5, beta=0.5, gamma=0)
-        org_shape = frame.shape
-        org_row_col = (org_shape[0], org_shape[1])
+        if (frame.shape[1], frame.shape[0]) != tuple(reseize):
+            frame = cv2.resize(frame, reseize, interpolation=cv2.INTER_AREA)
 
-        if reseize == org_row_col:
-            return self.map_color
-        else:
-            return cv2.resize(self.map_color,reseize)
\ No newline at end of file
+        return cv2.addWeighted(src1=frame, src2=self.map_color, alpha=0.5, beta=0.5, gamma=0)
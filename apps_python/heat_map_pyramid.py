@@ -0,0 +1,223 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from collections import OrderedDict
+import threading
+from time import time
+
+import numpy as np
+
+
+class HeatMapPyramid:
+    """
+    Store of per-interval heatmaps for time range queries.
+
+    Object centers are counted on a coarse grid in buckets of span
+    seconds. Buckets are rolled up into a dyadic pyramid: a bucket on level
+    k covers 2^k base buckets and is the sum of its two children on level
+    k-1, written when its last child is closed. Any time range is the sum
+    of O(log n) buckets. Each level keeps its newest buckets only, so
+    older history is available at coarser resolution: a range whose fine
+    buckets were dropped is answered with the coarser buckets covering it.
+    """
+
+    def __init__(self, frame_shape, cell_size=32, span=60, keep=128, levels=20):
+        """
+        Args:
+            frame_shape: (height, width) of the frames in pixels
+            cell_size: size of the square grid cells in pixels
+            span: length of the base buckets in seconds
+            keep: number of non empty buckets kept on each level
+            levels: number of levels, the top level buckets cover 2^(levels-1) spans
+        """
+        self.cell_size = cell_size
+        self.span = span
+        self.keep = keep
+        self.shape = (-(-frame_shape[0] // cell_size), -(-frame_shape[1] // cell_size))
+
+        # Buckets of each level by index, index j on level k covers the
+        # base buckets [j * 2^k, (j + 1) * 2^k)
+        self.levels = [OrderedDict() for _ in range(levels)]
+        # Newest index dropped from each level. Missing complete buckets
+        # after it are empty, up to it they may have been dropped.
+        self.dropped = [-1] * levels
+
+        # Base bucket currently written
+        self.current_index = None
+        self.current = np.zeros(self.shape, np.float32)
+
+        self.lock = threading.Lock()
+
+    def add(self, x, y, now=None):
+        """
+        Count points in the bucket of time now
+        Args:
+            x: x co-ordinates in pixels, inside the frame
+            y: y co-ordinates in pixels, inside the frame
+            now: time of the points, current time by default
+        """
+        if now is None:
+            now = time()
+        index = int(now // self.span)
+        with self.lock:
+            self.advance(index)
+            np.add.at(self.current, (y // self.cell_size, x // self.cell_size), 1)
+
+    def advance(self, index):
+        """
+        Close the current base bucket if index is past it and roll up the
+        buckets completed since
+        """
+        if self.current_index is None:
+            self.current_index = index
+            return
+        if index <= self.current_index:
+            return
+
+        closed = self.current_index
+        if self.current.any():
+            self.store(0, closed, self.current)
+            self.current = np.zeros(self.shape, np.float32)
+        self.current_index = index
+
+        # Buckets of earlier base buckets were rolled up when those were
+        # closed, only the buckets above the closed one can complete now
+        for level in range(1, len(self.levels)):
+            parent = closed >> level
+            if index >> level == parent:
+                break
+            children = self.levels[level - 1]
+            left = children.get(2 * parent)
+            right = children.get(2 * parent + 1)
+            if left is None and right is None:
+                continue
+            # buckets are never written once stored, a single child is shared
+            if left is None:
+                self.store(level, parent, right)
+            elif right is None:
+                self.store(level, parent, left)
+            else:
+                self.store(level, parent, left + right)
+
+    def store(self, level, index, bucket):
+        buckets = self.levels[level]
+        buckets[index] = bucket
+        if len(buckets) > self.keep:
+            dropped, _ = buckets.popitem(last=False)
+            self.dropped[level] = max(self.dropped[level], dropped)
+
+    def query(self, start, end):
+        """
+        Sum of the counts between two times. Partial buckets at the ends of
+        the range are counted in full, as are the coarser buckets used for
+        parts of the range whose fine buckets were dropped.
+        Args:
+            start: start time in seconds since the epoch
+            end: end time in seconds since the epoch
+        Returns:
+            (rows, cols) float32 array of counts and the (start, end) time
+            range of the buckets summed, None if no bucket was found
+        """
+        first = int(start // self.span)
+        last = -int(-end // self.span)
+        keys = set()
+        with self.lock:
+            # split [first, last) into the largest aligned buckets
+            while first < last:
+                level = 0
+                while (
+                    level + 1 < len(self.levels)
+                    and first % (2 << level) == 0
+                    and first + (2 << level) <= last
+                ):
+                    level += 1
+                self.find_buckets(keys, level, first >> level)
+                first += 1 << level
+
+            # a coarse bucket used for a dropped range may cover other parts
+            # of the range, count each detection once
+            keys = [
+                (level, index)
+                for level, index in keys
+                if not any(
+                    (up, index >> (up - level)) in keys
+                    for up in range(level + 1, len(self.levels))
+                )
+            ]
+            result = np.zeros(self.shape, np.float32)
+            for level, index in keys:
+                if level == 0 and index == self.current_index:
+                    result += self.current
+                else:
+                    result += self.levels[level][index]
+
+        if not keys:
+            return result, None
+        covered = (
+            min(index << level for level, index in keys) * self.span,
+            max((index + 1) << level for level, index in keys) * self.span,
+        )
+        return result, covered
+
+    def complete(self, level, index):
+        """
+        Check if a bucket will not get any more counts
+        """
+        return ((index + 1) << level) <= self.current_index
+
+    def find_buckets(self, keys, level, index):
+        """
+        Add the (level, index) of the stored buckets making up a bucket to
+        keys. Buckets which are not complete yet are made of their children,
+        dropped ones are replaced by the coarser bucket covering them.
+        """
+        if index in self.levels[level]:
+            keys.add((level, index))
+        elif self.current_index is None:
+            return
+        elif self.complete(level, index):
+            if index > self.dropped[level]:
+                # complete but empty
+                return
+            # dropped from this level
+            for up in range(level + 1, len(self.levels)):
+                parent = index >> (up - level)
+                if parent in self.levels[up]:
+                    keys.add((up, parent))
+                    return
+                if parent > self.dropped[up]:
+                    # the covering bucket is empty
+                    return
+        elif level == 0:
+            if index == self.current_index:
+                keys.add((0, index))
+        else:
+            self.find_buckets(keys, level - 1, 2 * index)
+            self.find_buckets(keys, level - 1, 2 * index + 1)
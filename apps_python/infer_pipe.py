@@ -29,23 +29,42 @@
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import numpy as np
+import sys
 from time import time
 import threading
+import queue
+from fractions import Fraction
 import utils
 import debug
 from post_process import PostProcess
+from motion_gate import MotionGate
+from pts_pairing import PtsPairer
+from gst_wrapper import FrameHandle, OutputPool
+from delivery import Mailbox
 
 class InferPipe:
     """
     Class to abstract the threading of multiple inference pipelines
+
+    By default one thread captures, infers, post-processes and pushes each
+    frame in turn. In pipelined mode a capture thread pulls frames and runs
+    inference while a post-process thread draws and pushes the previous
+    ones. The two are connected by a bounded queue, so the frame rate is
+    set by the slower stage instead of the sum of both.
+
+    In callback delivery mode the appsinks hand their samples to mailboxes
+    and the pipe has no thread of its own. A delivery.Dispatcher runs one
+    step, i.e. one frame, whenever a tensor is waiting.
     """
 
-    def __init__(self, sub_flow, gst_pipe):
+    def __init__(self, sub_flow, gst_pipe, delivery=None, dispatcher=None):
         """
         Constructor to create an InferPipe object.
         Args:
             sub_flow: sub_flow configuration
             gst_pipe: gstreamer pipe object
+            delivery: config_parser.Delivery, pull mode if None
+            dispatcher: delivery.Dispatcher running the pipe in callback mode
         """
         self.sub_flow = sub_flow
         self.gst_pipe = gst_pipe
@@ -60,7 +79,36 @@ class InferPipe:
             sub_flow.height,
             sub_flow.input.fps,
         )
+        # outputs are rendered into pooled buffers pushed without a copy
+        self.output_pool = OutputPool(
+            sub_flow.width,
+            sub_flow.height,
+            sub_flow.model.inference.output_pool_size,
+        )
         self.param = sub_flow.model
+        self.detect_interval = sub_flow.model.inference.detect_interval
+        self.frame_count = 0
+        self.last_result = None
+        self.motion_gate = None
+        inference = sub_flow.model.inference
+        if inference.motion_gate:
+            self.motion_gate = MotionGate(
+                threshold=inference.motion_threshold,
+                ratio=inference.motion_ratio,
+                heartbeat=inference.motion_heartbeat,
+            )
+        self.pairer = None
+        if inference.pts_pairing:
+            # samples of the same frame are at most half a frame apart
+            fps = float(Fraction(sub_flow.input.fps))
+            tolerance = 0.5e9 / fps if fps > 0 else 0
+            self.pairer = PtsPairer(
+                self.pull_tensor,
+                self.pull_frame,
+                tolerance,
+                window=inference.pts_window,
+                report=sub_flow.report,
+            )
         self.pre_proc_debug = None
         self.infer_debug = None
 
@@ -70,58 +118,310 @@ class InferPipe:
             if sub_flow.debug_config.inference:
                 self.infer_debug = debug.Debug(sub_flow.debug_config, "infer")
 
-        self.pipeline_thread = threading.Thread(target=self.pipeline)
+        self.pipelined = inference.pipelined
+        self.dispatcher = None
+        self.pre_mailbox = None
+        self.sen_mailbox = None
+        if delivery and delivery.mode == "callback":
+            if self.pipelined:
+                print("[ERROR] pipelined inference cannot be used with callback delivery.")
+                sys.exit()
+            self.dispatcher = dispatcher
+            # an appsink is stalled if it delivered nothing for this long
+            fps = float(Fraction(sub_flow.input.fps))
+            self.stall_deadline = delivery.stall_periods / fps if fps > 0 else 1
+            schedule = lambda: dispatcher.schedule(self)
+            self.pre_mailbox = Mailbox(
+                delivery.mailbox, delivery.mailbox_depth, schedule, self.stall_deadline
+            )
+            self.sen_mailbox = Mailbox(
+                delivery.mailbox, delivery.mailbox_depth, timeout=self.stall_deadline
+            )
+            gst_pipe.attach_mailbox(self.gst_pre_inp, self.pre_mailbox, sub_flow.flow.id)
+            gst_pipe.attach_mailbox(self.gst_sen_inp, self.sen_mailbox, sub_flow.flow.id)
+            self.stalled = False
+
+        self.post_thread = None
+        self.pipeline_thread = None
+        if self.pipelined:
+            self.queue = queue.Queue(maxsize=inference.queue_depth)
+            self.pipeline_thread = threading.Thread(target=self.capture_stage)
+            self.post_thread = threading.Thread(target=self.post_stage)
+        elif not self.dispatcher:
+            self.pipeline_thread = threading.Thread(target=self.pipeline)
         self.stop_thread = False
+        self.finished = False
+        self.finish_lock = threading.Lock()
 
     def start(self):
         """
         Start the pipeline
         """
+        if self.dispatcher:
+            self.dispatcher.watch(self)
+            return
         self.pipeline_thread.start()
+        if self.post_thread:
+            self.post_thread.start()
 
     def stop(self):
         """
         Stop the pipeline
         """
         self.stop_thread = True
+        for mailbox in (self.pre_mailbox, self.sen_mailbox):
+            if mailbox:
+                mailbox.close()
+        self.post_proc.stop()
+
+    def finish(self):
+        """
+        Release the held samples and end the output stream, once
+        """
+        with self.finish_lock:
+            if self.finished:
+                return
+            self.finished = True
+        if self.pairer:
+            self.pairer.release()
+        self.stop_thread = True
+        for mailbox in (self.pre_mailbox, self.sen_mailbox):
+            if mailbox:
+                mailbox.close()
+        self.gst_pipe.send_eos(self.gst_post_out)
+        self.output_pool.free()
+        self.post_proc.stop()
+
+    def should_infer(self, frame):
+        """
+        Decide if inference runs on this frame, based on detect_interval and
+        the motion gate
+        Args:
+            frame: frame from the sensor
+        """
+        # Run inference only every detect_interval frames
+        infer = self.frame_count % self.detect_interval == 0
+        self.frame_count += 1
+
+        if self.motion_gate:
+            start = time()
+            infer = self.motion_gate(frame, infer, self.post_proc.is_tracking())
+            end = time()
+            self.sub_flow.report.report_proctime("motion-gate", (end - start))
+            self.sub_flow.report.report_count("motion-gate " + self.motion_gate.state)
+            if not infer:
+                self.sub_flow.report.report_count("inference skipped")
+
+        return infer
+
+    def pull_tensor(self):
+        """
+        Pull the next pre-processed tensor
+        Returns:
+            FrameHandle of the tensor or None at the end of the stream
+        """
+        return self.gst_pipe.pull_tensor(
+            self.gst_pre_inp,
+            self.sub_flow.input.loop,
+            self.sub_flow.model.crop[0],
+            self.sub_flow.model.crop[1],
+            self.sub_flow.model.data_layout,
+            self.sub_flow.model.input_tensor_types[0],
+            mailbox=self.pre_mailbox,
+        )
+
+    def pull_frame(self):
+        """
+        Pull the next sensor frame, mapped for drawing in place if possible
+        Returns:
+            FrameHandle of the frame or None at the end of the stream
+        """
+        return self.gst_pipe.pull_frame(
+            self.gst_sen_inp,
+            self.sub_flow.input.loop,
+            writable=True,
+            mailbox=self.sen_mailbox,
+        )
+
+    def capture(self):
+        """
+        Pull the next tensor and frame and run inference if it is scheduled
+        Returns:
+            (frame, result, infer) or None at the end of the stream. frame
+            is a FrameHandle released by post_process. result is None if
+            inference was skipped.
+        """
+        # capture and pre-process
+        if self.pairer:
+            paired = self.pairer()
+            if paired is None:
+                return None
+            tensor, frame = paired
+        else:
+            tensor = self.pull_tensor()
+            if tensor is None:
+                return None
+
+            frame = self.pull_frame()
+            if frame is None:
+                tensor.release()
+                return None
+
+        with tensor:
+            infer = self.should_infer(frame.data)
+
+            result = None
+            if infer:
+                input_img = tensor.data
+                if self.pre_proc_debug:
+                    self.pre_proc_debug.log(str(input_img.flatten()))
+
+                # Inference
+                start = time()
+                result = self.run_time(input_img)
+                end = time()
+                self.sub_flow.report.report_proctime("dl-inference", (end - start))
+
+                if self.infer_debug:
+                    self.infer_debug.log(str(result))
+
+        return frame, result, infer
+
+    def post_process(self, frame, result, infer):
+        """
+        Post-process a captured frame and push it to the output. The frame
+        is released once the output is pushed.
+        Args:
+            frame: FrameHandle of the frame from the sensor
+            result: output of inference, None if it was skipped
+            infer: True if inference ran on this frame
+        """
+        report = self.sub_flow.report
+        output = self.output_pool.acquire()
+        if not output.pooled:
+            report.report_count("output pool exhausted")
+
+        with frame:
+            img = frame.data
+            if not frame.writable:
+                # the overlays cannot be drawn on the mapped buffer
+                img = img.copy()
+                report.report_count("frame copies")
+
+            if infer:
+                out_frame = self.post_proc(img, result, out=output.data)
+                self.last_result = result
+            else:
+                out_frame = self.post_proc.predict(img, self.last_result, out=output.data)
+
+            if out_frame is output.data:
+                self.gst_pipe.push_output(output, self.gst_post_out)
+            elif output.data is not None and out_frame.shape == output.data.shape:
+                # drawn on the input frame, copy it once into the output
+                output.data[...] = out_frame
+                report.report_count("output copies")
+                self.gst_pipe.push_output(output, self.gst_post_out)
+            else:
+                output.unmap()
+                self.gst_pipe.push_frame(out_frame, self.gst_post_out)
+                report.report_count("output copies")
+
+        report.report_metric("live frame handles", FrameHandle.live, "handles")
+        if FrameHandle.leaked:
+            report.report_metric("leaked frame handles", FrameHandle.leaked, "handles")
+        # Increment frame count
+        report.report_frame()
 
     def pipeline(self):
         """
         Callback function for pipeline thread
         """
         while self.stop_thread == False:
-            # capture and pre-process
-            input_img = self.gst_pipe.pull_tensor(
-                self.gst_pre_inp,
-                self.sub_flow.input.loop,
-                self.sub_flow.model.crop[0],
-                self.sub_flow.model.crop[1],
-                self.sub_flow.model.data_layout,
-                self.sub_flow.model.input_tensor_types[0],
-            )
-            if type(input_img) == type(None):
+            captured = self.capture()
+            if captured is None:
                 break
+            self.post_process(*captured)
+
+        self.finish()
+
+    def step(self):
+        """
+        Process one frame in callback delivery mode, called by a worker of
+        the dispatcher when a tensor is waiting
+        Returns:
+            False once the pipe is finished
+        """
+        if self.finished:
+            return False
+        if self.stop_thread:
+            self.finish()
+            return False
+        captured = self.capture()
+        if captured is None:
+            self.finish()
+            return False
+        self.post_process(*captured)
+        return True
 
-            if self.pre_proc_debug:
-                self.pre_proc_debug.log(str(input_img.flatten()))
+    def ready(self):
+        """
+        Check if a step can run without waiting for a tensor
+        """
+        return self.pre_mailbox is not None and self.pre_mailbox.ready()
 
-            # Inference
+    def check_stall(self, now):
+        """
+        Report an appsink which delivered nothing for longer than the stall
+        deadline. Called by the watchdog of the dispatcher.
+        Args:
+            now: current time.monotonic()
+        """
+        if self.finished:
+            return
+        last = [m.last_put for m in (self.pre_mailbox, self.sen_mailbox)]
+        if None in last:
+            # nothing delivered yet, the pipeline is still starting
+            return
+        stalled = now - min(last) > self.stall_deadline
+        if stalled and not self.stalled:
+            self.sub_flow.report.report_count("appsink stall")
+        self.stalled = stalled
+
+    def capture_stage(self):
+        """
+        Callback function for the capture thread in pipelined mode. Captured
+        frames are queued for the post-process thread, None marks the end.
+        """
+        report = self.sub_flow.report
+        while self.stop_thread == False:
+            captured = self.capture()
+            if captured is None:
+                break
+
+            # time blocked on a full queue, i.e. waiting for post-processing
             start = time()
-            result = self.run_time(input_img)
+            self.queue.put(captured)
             end = time()
-            self.sub_flow.report.report_proctime("dl-inference", (end - start))
+            report.report_proctime("capture queue wait", (end - start))
+            report.report_metric("queue occupancy", self.queue.qsize(), "frames")
 
-            if self.infer_debug:
-                self.infer_debug.log(str(result))
+        if self.pairer:
+            self.pairer.release()
+        self.queue.put(None)
 
-            # post-process
-            frame = self.gst_pipe.pull_frame(self.gst_sen_inp, self.sub_flow.input.loop)
-            if type(frame) == type(None):
+    def post_stage(self):
+        """
+        Callback function for the post-process thread in pipelined mode
+        """
+        report = self.sub_flow.report
+        while True:
+            # time blocked on an empty queue, i.e. waiting for inference
+            start = time()
+            captured = self.queue.get()
+            end = time()
+            if captured is None:
                 break
-            out_frame = self.post_proc(frame, result)
-            self.gst_pipe.push_frame(out_frame, self.gst_post_out)
-            # Increment frame count
-            self.sub_flow.report.report_frame()
+            report.report_proctime("post queue wait", (end - start))
+            self.post_process(*captured)
 
-        self.stop_thread = True
-        self.gst_pipe.send_eos(self.gst_post_out)
\ No newline at end of file
+        self.finish()
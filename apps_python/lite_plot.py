@@ -2,6 +2,7 @@ import numpy as np
 import warnings
 import math
 import cv2
+import text_cache
 
 
 class LitePlot:
@@ -174,6 +175,16 @@ class LitePlot:
                     case _ :
                         warnings.warn("Unkown key ", key, " for ticks properties. The default value is used.")
 
+        # the layout is computed once, the static part of the plot is
+        # rendered on first use and kept in self.base
+        self.compute_layout()
+        self.base = None
+        self.base_marks = None
+        # long lived image updated by update_hist
+        self.ticket = None
+        self.drawn_labels = {}
+        self.drawn_bars = None
+
 
     def mist(self, x, bins=None, range=None, density=False, weights=None,
                 cumulative=False, bottom=None, histtype='bar', align='mid',
@@ -185,85 +196,184 @@ class LitePlot:
     # draw histogram    
     def hist(self, x, bins=None, yrange=None, color=None,rwidth=None):  
 
-        if color is None:
-            bar_colors = (255, 179, 179)
-        else:
-            bar_colors = color
-
         if bins is None:
             bins = 'auto'
 
-        if rwidth is None:
-            rwidth = 1
-        
         if yrange is None:
             yrange = (min(x),max(x))
 
+        # Computer Histogram values and bin edges
+        val, bin_edge = np.histogram(x,bins=bins, range=yrange)
+
+        return self.hist_binned(val, bin_edge, color=color, rwidth=rwidth)
+
+    # draw histogram from bin counts computed by the caller
+    def hist_binned(self, val, bin_edge, color=None, rwidth=None):
+        """
+        Render a histogram into a new image.
+        Parameters:
+            val (array): bin counts.
+            bin_edge (array): bin edges, one more than the counts.
+            color (tuple): bar color.
+            rwidth (float): bar width relative to the bin width.
+        Returns:
+            the plot image.
+        """
+        if color is None:
+            color = (255, 179, 179)
 
+        if rwidth is None:
+            rwidth = 1
+
+        labels, marks = self.layout_ticks(val, bin_edge)
+        ticket = self.get_base(marks).copy()
+        self.draw_bars(ticket, val, color, rwidth)
+        for label in labels.values():
+            self.draw_tick_label(ticket, label)
+        self.draw_axes(ticket, marks)
+
+        return ticket
+
+    def update_hist(self, val, bin_edge, color=None, rwidth=None):
+        """
+        Update the plot image kept by this object with a new histogram.
+        Only the bars and the tick labels that changed are redrawn over the
+        cached static part of the plot.
+        Parameters:
+            val (array): bin counts.
+            bin_edge (array): bin edges, one more than the counts.
+            color (tuple): bar color.
+            rwidth (float): bar width relative to the bin width.
+        Returns:
+            the plot image. It is owned by the plot and changed in place by
+            the next update.
+        """
+        if color is None:
+            color = (255, 179, 179)
+
+        if rwidth is None:
+            rwidth = 1
+
+        labels, marks = self.layout_ticks(val, bin_edge)
+        bars = (tuple(val), tuple(color), rwidth)
+
+        if self.ticket is None or marks != self.base_marks:
+            # first update or the tick marks moved, start from the base
+            self.ticket = self.get_base(marks).copy()
+            self.drawn_labels = {}
+            self.drawn_bars = None
+
+        # areas restored from the base before drawing
+        dirty = []
+        for key in labels.keys() | self.drawn_labels.keys():
+            label = labels.get(key)
+            drawn = self.drawn_labels.get(key)
+            if label is not None and drawn is not None and label[:2] == drawn[:2]:
+                continue
+            if drawn is not None:
+                dirty.append(drawn[2])
+            if label is not None:
+                dirty.append(label[2])
+
+        redraw_bars = bars != self.drawn_bars
+        if redraw_bars:
+            dirty.append(self.plot_rect)
+
+        if len(dirty) == 0:
+            return self.ticket
+
+        for y1, y2, x1, x2 in dirty:
+            self.ticket[y1:y2, x1:x2] = self.base[y1:y2, x1:x2]
+
+        if redraw_bars:
+            self.draw_bars(self.ticket, val, color, rwidth)
+
+        # labels next to a restored area may have lost some pixels as well
+        for label in labels.values():
+            if any(self.overlap(label[2], rect) for rect in dirty):
+                self.draw_tick_label(self.ticket, label)
+
+        self.draw_axes(self.ticket, marks)
+
+        self.drawn_labels = labels
+        self.drawn_bars = bars
+
+        return self.ticket
+
+    def compute_layout(self):
+        """
+        Compute the position of the plot area. It only depends on the plot
+        properties, so it is done once when the plot is created.
+        """
         # basic dimentions calculations
         # title hight
         if self.title_text is not None:
-            (text_w, text_h),_ = cv2.getTextSize(self.title_text, self.title_text_font, self.title_text_size, self.title_text_thick)
+            (text_w, text_h),_ = text_cache.get_text_size(self.title_text, self.title_text_font, self.title_text_size, self.title_text_thick)
             title_h = text_h + self.title_bot_margin
-            title_w = text_w
         else:
             title_h = 0
-            title_w = 0
 
         # xlabel
-        xlabel_h = 0
-        xlabel_w = 0
+        self.xlabel_h = 0
         if self.xlabel_text is not None:
             if self.xlabel_loc not in ['side_right', 'side_left']:
-                (text_w, text_h),_ = cv2.getTextSize(self.xlabel_text, self.xlabel_text_font, self.xlabel_text_size, self.xlabel_text_thick)
-                xlabel_h = text_h + self.xlabel_top_margin
-                xlabel_w = text_w
-            
+                (text_w, text_h),_ = text_cache.get_text_size(self.xlabel_text, self.xlabel_text_font, self.xlabel_text_size, self.xlabel_text_thick)
+                self.xlabel_h = text_h + self.xlabel_top_margin
 
         # ylabel
         if self.ylabel_text is not None:
-            (text_w, text_h),_ = cv2.getTextSize(self.ylabel_text, self.ylabel_text_font, self.ylabel_text_size, self.ylabel_text_thick)
+            (text_w, text_h),_ = text_cache.get_text_size(self.ylabel_text, self.ylabel_text_font, self.ylabel_text_size, self.ylabel_text_thick)
             ylabel_h = text_h + self.ylabel_right_margin
-            ylabel_w = text_w
         else:
             ylabel_h = 0
-            ylabel_w = 0
-
 
         # tiks
         # assuming two characters for y ticks. If text over flow, change plot left margin
-        (text_w, text_h),_ = cv2.getTextSize('XX', self.tick_text_font, self.tick_text_size, self.tick_text_thick)
+        (text_w, text_h),_ = text_cache.get_text_size('XX', self.tick_text_font, self.tick_text_size, self.tick_text_thick)
         y_tick_w = text_w + self.tick_mark_len
-        x_tick_h = text_h + self.tick_mark_len
-
-        
+        self.x_tick_h = text_h + self.tick_mark_len
 
         # plot
-        plot_h = self.h - self.margin_bottom - self.margin_top - title_h - x_tick_h - xlabel_h
-        plot_y_start = self.margin_top + title_h
+        self.plot_h = self.h - self.margin_bottom - self.margin_top - title_h - self.x_tick_h - self.xlabel_h
+        self.plot_y_start = self.margin_top + title_h
 
-        plot_w = self.w - self.margin_right - self.margin_left -y_tick_w - ylabel_h
-        plot_x_start = self.margin_left + y_tick_w + ylabel_h
+        self.plot_w = self.w - self.margin_right - self.margin_left -y_tick_w - ylabel_h
+        self.plot_x_start = self.margin_left + y_tick_w + ylabel_h
 
+        # plot area including the boarders, as (y1, y2, x1, x2)
+        self.plot_rect = self.clip_rect(self.plot_y_start, self.plot_y_start + self.plot_h + 1,
+                                        self.plot_x_start, self.plot_x_start + int(self.plot_w) + 1)
 
-        back_ground_color = self.color
-        text_color = self.text_color
+    def get_base(self, marks):
+        """
+        Get the static part of the plot, rendering it if the tick marks
+        moved since it was last rendered.
+        Parameters:
+            marks (tuple): tick mark lines from layout_ticks.
+        """
+        if self.base is None or marks != self.base_marks:
+            self.base = self.render_base(marks)
+            self.base_marks = marks
+        return self.base
 
-        # Computer Histogram values and bin edges
-        val, bin_edge = np.histogram(x,bins=bins, range=yrange)
+    def render_base(self, marks):
+        """
+        Render the background, title, axis labels, tick marks and boarders.
+        Parameters:
+            marks (tuple): tick mark lines from layout_ticks.
+        """
+        plot_x_start = self.plot_x_start
+        plot_w = self.plot_w
 
         # Create Tickete
-        ticket = self.create_image(self.h, self.w,back_ground_color)
-
-        
+        ticket = self.create_image(self.h, self.w, self.color)
 
 #########################################################################################
 ##########       Draw tile
 #########################################################################################
         # title 
-        title_h = 0 # the total hieght taken by title including text and margin
         if self.title_text is not None:
-            (text_w, text_h),_ = cv2.getTextSize(self.title_text, self.title_text_font, self.title_text_size, self.title_text_thick)
+            (text_w, text_h),_ = text_cache.get_text_size(self.title_text, self.title_text_font, self.title_text_size, self.title_text_thick)
             match self.title_loc:
                 case "left":
                     text_x = plot_x_start
@@ -274,46 +384,65 @@ class LitePlot:
                     text_x = self.w - self.margin_right - text_w
 
             text_bottom = self.margin_top + text_h       
-            cv2.putText(ticket, self.title_text,(text_x,text_bottom) , self.title_text_font, self.title_text_size,self.title_text_color, self.title_text_thick)
+            text_cache.put_text(ticket, self.title_text,(text_x,text_bottom) , self.title_text_font, self.title_text_size,self.title_text_color, self.title_text_thick)
 
 #########################################################################################
-##########       Draw plot
+##########       Draw lables
 #########################################################################################
 
-       
-        # color palette for the bars
+        # draw x label
+        if self.xlabel_text is not None:
+            (text_w, text_h),_ = text_cache.get_text_size(self.xlabel_text, self.xlabel_text_font, self.xlabel_text_size, self.xlabel_text_thick)
+            match self.xlabel_loc:
+                case "left":
+                    text_x = plot_x_start
+                case "center":
+                    text_x = int(plot_x_start + plot_w/2 - text_w/2)
+                case "right":
+                    text_x = self.w - self.margin_right - text_w
+                case "side_left":
+                    text_x = plot_x_start - text_w - 10
+                case "side_right":
+                    text_x = plot_x_start + plot_w
 
-        # normalize values
-        if max(val) > 0:
-            norm_val = [float(i)/max(val) for i in val]
-        else:
-            norm_val = val
+            text_bottom = self.h - self.margin_bottom       
+            text_cache.put_text(ticket, self.xlabel_text,(text_x,text_bottom) , self.xlabel_text_font, self.xlabel_text_size,self.xlabel_text_color, self.xlabel_text_thick)
 
-        top_number_h = 40
-        max_bar_h = plot_h
-        bar_w = plot_w/len(val)
+        # draw y label
+        if self.ylabel_text is not None:
+            (text_w, text_h),_ = text_cache.get_text_size(self.ylabel_text, self.ylabel_text_font, self.ylabel_text_size, self.ylabel_text_thick)
+            match self.xlabel_loc:
+                case "top":
+                    text_x = plot_x_start
+                case "center":
+                    text_x = int(plot_x_start + plot_w/2 - text_w/2)
+                case "bottom":
+                    text_x = self.w - self.margin_right - text_w
 
-        for i in range(len(val)):
-            bar_h = int(max_bar_h * norm_val[i])
-            # draw bar
-            xc = plot_x_start + bar_w/2 + i * bar_w
-            x1 = int(xc - bar_w*rwidth/2)
-            x2 = int(xc + bar_w*rwidth/2)
-            y1 = int(plot_y_start + (plot_h - bar_h))
-            y2 = int(plot_y_start + plot_h)
+            text_bottom = self.margin_left + self.xlabel_h       
+            text_cache.put_text(ticket, self.ylabel_text,(text_x,text_bottom) , self.ylabel_text_font, self.ylabel_text_size,self.ylabel_text_color, self.ylabel_text_thick)
 
-            cv2.rectangle(ticket, (x1, y1), (x2, y2), bar_colors, -1)
+        self.draw_axes(ticket, marks)
 
-            # add number above bar
-            # (text_w, text_h),_ = cv2.getTextSize(str(val[i]), cv2.FONT_HERSHEY_DUPLEX, 1, 2)
-            # text_start = x1 + int((bar_w - text_w)/2)
-            # cv2.putText(ticket, str(val[i]),(text_start,y1-5) , cv2.FONT_HERSHEY_DUPLEX, 1, text_color, 2)
+        return ticket
 
-#########################################################################################
-##########       Draw tick / lables
-#########################################################################################
+    def layout_ticks(self, val, bin_edge):
+        """
+        Compute the tick labels and tick marks of a histogram.
+        Parameters:
+            val (array): bin counts.
+            bin_edge (array): bin edges.
+        Returns:
+            labels (dict): ('y', i) or ('x', i) to (text, org, rect).
+            marks (tuple): tick mark lines as (point, point).
+        """
+        plot_x_start = self.plot_x_start
+        plot_y_start = self.plot_y_start
+        plot_h = self.plot_h
+        labels = {}
+        marks = []
 
-        # draw y_tick
+        # y ticks
         max_bin = max(val)
         y_tick_setp,r = divmod(max_bin, 4)
         y_tick_setp +=1
@@ -324,73 +453,122 @@ class LitePlot:
 
         y_ticks = ["%.0f" % number for number in y_tick]
 
-        text_bottom = self.h - self.margin_bottom
-        y_tick_h = plot_h/(len(y_tick)-1)
         for i in range(len(y_tick)):
             yc = int(math.ceil(plot_y_start +  (1 -y_tick_norm[i]) * plot_h))
 
-
-            (text_w, text_h),_ = cv2.getTextSize(y_ticks[i], self.tick_text_font, self.tick_text_size, self.tick_text_thick)
+            (text_w, text_h),_ = text_cache.get_text_size(y_ticks[i], self.tick_text_font, self.tick_text_size, self.tick_text_thick)
             text_x = int(plot_x_start - self.tick_mark_len - text_w)
             text_bottom = int(yc + (text_h/2))
-            cv2.putText(ticket, y_ticks[i],(text_x,text_bottom) , self.tick_text_font, self.tick_text_size, self.tick_text_color, self.tick_text_thick)
+            labels[('y', i)] = self.tick_label(y_ticks[i], (text_x, text_bottom))
 
-            # tick mark
-            x1 = plot_x_start
-            x2 = plot_x_start - self.tick_mark_len
-            cv2.line(ticket,(x1, yc), (x2, yc), self.tick_mark_color, self.tick_mark_thick)
-        
+            marks.append(((plot_x_start, yc), (plot_x_start - self.tick_mark_len, yc)))
 
-    
-        # draw x ticks
+        # x ticks
         ticks = ["%.0f" % number for number in bin_edge]
-        text_bottom = plot_y_start + plot_h + x_tick_h
-        tick_w = plot_w/(len(ticks)-1)
+        text_bottom = plot_y_start + plot_h + self.x_tick_h
+        tick_w = self.plot_w/(len(ticks)-1)
         for i in range(len(ticks)):
             xc = int(plot_x_start+ i * tick_w)
-            for j, line in enumerate(ticks[i].split(' ')):
-                (text_w, text_h),_ = cv2.getTextSize(line, self.tick_text_font, self.tick_text_size, self.tick_text_thick)
-                text_x = int(xc - text_w/2)
-                cv2.putText(ticket, line,(text_x,text_bottom) , self.tick_text_font, self.tick_text_size, self.tick_text_color, self.tick_text_thick)
+            (text_w, text_h),_ = text_cache.get_text_size(ticks[i], self.tick_text_font, self.tick_text_size, self.tick_text_thick)
+            text_x = int(xc - text_w/2)
+            labels[('x', i)] = self.tick_label(ticks[i], (text_x, text_bottom))
 
-            # tick mark
-                y1 = text_bottom- text_h 
-                y2 = y1 - self.tick_mark_len
-                cv2.line(ticket,(xc, y1), (xc, y2), self.tick_mark_color, self.tick_mark_thick)
+            y1 = text_bottom- text_h 
+            y2 = y1 - self.tick_mark_len
+            marks.append(((xc, y1), (xc, y2)))
 
-        # draw x label
-        if self.xlabel_text is not None:
-            (text_w, text_h),_ = cv2.getTextSize(self.xlabel_text, self.xlabel_text_font, self.xlabel_text_size, self.xlabel_text_thick)
-            match self.xlabel_loc:
-                case "left":
-                    text_x = plot_x_start
-                case "center":
-                    text_x = int(plot_x_start + plot_w/2 - text_w/2)
-                case "right":
-                    text_x = self.w - self.margin_right - text_w
-                case "side_left":
-                    text_x = plot_x_start - text_w - 10
-                case "side_right":
-                    text_x = plot_x_start + plot_w
+        return labels, tuple(marks)
 
-            text_bottom = self.h - self.margin_bottom       
-            cv2.putText(ticket, self.xlabel_text,(text_x,text_bottom) , self.xlabel_text_font, self.xlabel_text_size,self.xlabel_text_color, self.xlabel_text_thick)
+    def tick_label(self, text, org):
+        """
+        Build a tick label with the image area it covers.
+        Parameters:
+            text (string): label text.
+            org (tuple): bottom left corner of the text.
+        Returns:
+            (text, org, rect) with rect as (y1, y2, x1, x2).
+        """
+        (text_w, text_h), baseline = text_cache.get_text_size(text, self.tick_text_font, self.tick_text_size, self.tick_text_thick)
+        # the strokes can go over the text size by the thickness
+        pad = self.tick_text_thick + 1
+        rect = self.clip_rect(org[1] - text_h - pad, org[1] + baseline + pad,
+                              org[0] - pad, org[0] + text_w + pad)
+        return text, org, rect
+
+    def clip_rect(self, y1, y2, x1, x2):
+        """
+        Clip a (y1, y2, x1, x2) rectangle to the plot image.
+        """
+        return (max(y1, 0), min(y2, self.h), max(x1, 0), min(x2, self.w))
 
-        # draw y label
-        if self.ylabel_text is not None:
-            (text_w, text_h),_ = cv2.getTextSize(self.ylabel_text, self.ylabel_text_font, self.ylabel_text_size, self.ylabel_text_thick)
-            match self.xlabel_loc:
-                case "top":
-                    text_x = plot_x_start
-                case "center":
-                    text_x = int(plot_x_start + plot_w/2 - text_w/2)
-                case "bottom":
-                    text_x = self.w - self.margin_right - text_w
+    @staticmethod
+    def overlap(a, b):
+        """
+        Check if two (y1, y2, x1, x2) rectangles overlap.
+        """
+        return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+    def draw_tick_label(self, ticket, label):
+        """
+        Draw one tick label returned by layout_ticks.
+        """
+        text, org, _ = label
+        text_cache.put_text(ticket, text, org, self.tick_text_font, self.tick_text_size, self.tick_text_color, self.tick_text_thick)
+
+    def draw_bars(self, ticket, val, bar_colors, rwidth):
+        """
+        Draw the histogram bars.
+        Parameters:
+            ticket (numpy array): plot image.
+            val (array): bin counts.
+            bar_colors (tuple): bar color.
+            rwidth (float): bar width relative to the bin width.
+        """
+        plot_x_start = self.plot_x_start
+        plot_y_start = self.plot_y_start
+        plot_h = self.plot_h
+
+        # normalize values
+        max_val = max(val)
+        if max_val > 0:
+            norm_val = [float(i)/max_val for i in val]
+        else:
+            norm_val = val
+
+        max_bar_h = plot_h
+        bar_w = self.plot_w/len(val)
+
+        for i in range(len(val)):
+            bar_h = int(max_bar_h * norm_val[i])
+            # draw bar
+            xc = plot_x_start + bar_w/2 + i * bar_w
+            x1 = int(xc - bar_w*rwidth/2)
+            x2 = int(xc + bar_w*rwidth/2)
+            y1 = int(plot_y_start + (plot_h - bar_h))
+            y2 = int(plot_y_start + plot_h)
 
-            text_bottom = self.margin_left + xlabel_h       
-            cv2.putText(ticket, self.ylabel_text,(text_x,text_bottom) , self.ylabel_text_font, self.ylabel_text_size,self.ylabel_text_color, self.ylabel_text_thick)
+            cv2.rectangle(ticket, (x1, y1), (x2, y2), bar_colors, -1)
 
+            # add number above bar
+            # (text_w, text_h),_ = cv2.getTextSize(str(val[i]), cv2.FONT_HERSHEY_DUPLEX, 1, 2)
+            # text_start = x1 + int((bar_w - text_w)/2)
+            # cv2.putText(ticket, str(val[i]),(text_start,y1-5) , cv2.FONT_HERSHEY_DUPLEX, 1, text_color, 2)
+
+    def draw_axes(self, ticket, marks):
+        """
+        Draw the tick marks and the boarders. They are drawn over the bars
+        and tick labels.
+        Parameters:
+            ticket (numpy array): plot image.
+            marks (tuple): tick mark lines from layout_ticks.
+        """
+        for p1, p2 in marks:
+            cv2.line(ticket, p1, p2, self.tick_mark_color, self.tick_mark_thick)
 
+        plot_x_start = self.plot_x_start
+        plot_y_start = self.plot_y_start
+        plot_w = self.plot_w
+        plot_h = self.plot_h
 
 #########################################################################################
 ##########       Draw boarders
@@ -426,10 +604,6 @@ class LitePlot:
             y1 = plot_y_start
             y2 = plot_y_start + plot_h
             cv2.line(ticket,(x1, y1), (x2, y2), self.tick_mark_color, self.tick_mark_thick)
-
-
-
-        return ticket
     
     def create_image(self, h,w,color):
         """
@@ -0,0 +1,110 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap motion detector used to gate inference. Consecutive frames are
+    downscaled to a small grayscale image and differenced. While the scene
+    is static and nothing is tracked, inference only runs at a heartbeat
+    rate. It returns to the full rate as soon as motion appears.
+    """
+
+    # Frames to keep the full rate after the last motion
+    HOLD_FRAMES = 15
+
+    def __init__(self, width=64, threshold=25, ratio=0.002, heartbeat=30):
+        """
+        Args:
+            width: width of the downscaled image, height keeps the aspect ratio
+            threshold: minimum absolute difference of a changed pixel
+            ratio: minimum fraction of changed pixels to detect motion
+            heartbeat: frames between inferences while the scene is static
+        """
+        self.width = width
+        self.threshold = threshold
+        self.ratio = ratio
+        self.heartbeat = heartbeat
+        self.prev = None
+        self.hold = 0
+        self.frames_since_infer = 0
+        self.state = "motion"
+
+    def detect(self, frame):
+        """
+        Detect motion between this frame and the previous one
+        Args:
+            frame: RGB frame from the sensor
+        """
+        height = max(1, frame.shape[0] * self.width // frame.shape[1])
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        prev, self.prev = self.prev, small
+        if prev is None:
+            return True
+        diff = cv2.absdiff(small, prev)
+        changed = np.count_nonzero(diff > self.threshold)
+        return changed > self.ratio * diff.size
+
+    def __call__(self, frame, scheduled, tracking):
+        """
+        Decide if inference runs on this frame
+        Args:
+            frame: RGB frame from the sensor
+            scheduled: inference is due at the full rate on this frame
+            tracking: objects are currently being tracked
+        Returns:
+            True if inference should run
+        """
+        if self.detect(frame):
+            self.hold = MotionGate.HOLD_FRAMES
+        elif self.hold > 0:
+            self.hold -= 1
+
+        if self.hold > 0:
+            self.state = "motion"
+            infer = scheduled
+        elif tracking:
+            self.state = "tracking"
+            infer = scheduled
+        else:
+            self.state = "idle"
+            infer = self.frames_since_infer + 1 >= self.heartbeat
+            if infer:
+                self.state = "heartbeat"
+
+        if infer:
+            self.frames_since_infer = 0
+        else:
+            self.frames_since_infer += 1
+        return infer
@@ -27,13 +27,135 @@
 #  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 #  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
-from typing import Callable, Optional, Sequence, Tuple
+from typing import TYPE_CHECKING, Callable, Optional, Sequence, Tuple
 import numpy as np
 import cv2
 import math
+import threading
 from time import time
-from norfair.tracker import TrackedObject
-from norfair.drawing.color import Palette
+import text_cache
+import palette
+
+if TYPE_CHECKING:
+    from norfair.tracker import TrackedObject
+
+
+class TimeHistogram:
+    """
+    Histogram of durations with a fixed number of equal width bins starting
+    at zero. The range starts at min_range and doubles, merging neighbouring
+    bins, whenever a value at or above it is added. A value is in bin
+    floor(value / width) both before and after a merge, so it is removed
+    from the bin it was added to. The range never shrinks: it stays large
+    enough for the longest duration seen, even once that value is removed.
+    """
+
+    def __init__(self, bins=12, min_range=60):
+        """
+        Args:
+            bins: number of bins, must be even
+            min_range: initial upper end of the last bin in seconds
+        """
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.width = min_range / bins
+
+    def grow(self, value):
+        """
+        Rebin until value fits in the range
+        """
+        bins = len(self.counts)
+        while int(value / self.width) >= bins:
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts[: bins // 2] = merged
+            self.counts[bins // 2 :] = 0
+            self.width *= 2
+
+    def index(self, values):
+        # the range was grown to hold the values, see grow
+        return (np.asarray(values) / self.width).astype(np.intp)
+
+    def add(self, values):
+        if len(values) == 0:
+            return
+        self.grow(np.max(values))
+        np.add.at(self.counts, self.index(values), 1)
+
+    def remove(self, values):
+        if len(values) == 0:
+            return
+        np.subtract.at(self.counts, self.index(values), 1)
+
+    def get(self, values=()):
+        """
+        Bin counts and bin edges, including extra values which are not
+        stored in the histogram
+        Args:
+            values: extra values, e.g. times of objects still in frame
+        """
+        if len(values):
+            self.grow(np.max(values))
+        counts = self.counts.copy()
+        if len(values):
+            np.add.at(counts, self.index(values), 1)
+        edges = np.arange(len(counts) + 1) * self.width
+        return counts, edges
+
+
+class TimeHistory:
+    """
+    Ring buffer of durations with the time they were recorded. The oldest
+    values are dropped when the buffer is full or when they are older than
+    the retention window.
+    """
+
+    def __init__(self, size=10000, retention=None):
+        """
+        Args:
+            size: maximum number of values kept
+            retention: maximum age of the values in seconds, None keeps
+                       values until the buffer is full
+        """
+        self.size = size
+        self.retention = retention
+        self.values = np.zeros(size, dtype=np.float32)
+        self.stamps = np.zeros(size, dtype=np.float64)
+        self.start = 0
+        self.count = 0
+        self.histogram = TimeHistogram()
+
+    def append(self, value, stamp):
+        idx = (self.start + self.count) % self.size
+        if self.count == self.size:
+            self.histogram.remove(self.values[idx : idx + 1])
+            self.start = (self.start + 1) % self.size
+        else:
+            self.count += 1
+        self.values[idx] = value
+        self.stamps[idx] = stamp
+        # bin the stored float32 value, the one removed later
+        self.histogram.add(self.values[idx : idx + 1])
+
+    def order(self):
+        """
+        Indices of the stored values from the oldest to the newest
+        """
+        return (self.start + np.arange(self.count)) % self.size
+
+    def expire(self, now):
+        """
+        Drop values older than the retention window
+        """
+        if self.retention is None or self.count == 0:
+            return
+        # stamps are appended in increasing order
+        order = self.order()
+        expired = np.searchsorted(self.stamps[order], now - self.retention)
+        self.histogram.remove(self.values[order[:expired]])
+        self.start = (self.start + expired) % self.size
+        self.count -= expired
+
+    def get(self):
+        return self.values[self.order()]
 
 
 class ObjectTimeCount:
@@ -44,40 +166,59 @@ class ObjectTimeCount:
     def __init__(
                 self,
                 stand_time_hit: Optional[int] = 10,
+                history_size: Optional[int] = 10000,
+                history_retention: Optional[float] = None,
         ):
         
         # Time object not moving in seconds before considered standing or setting.
         self.stand_time_hit = stand_time_hit
 
-        # Initialized dictionary lists for 
-        self.current_object_time = dict()   # Time of objects currently in frame      
-        self.history_object_time = dict()   # Time of history objects i.e no longer in frame
+        # Time of objects currently in frame
+        self.current_object_time = dict()
+
+        # Total and still times of objects no longer in frame
+        self.total_time_history = TimeHistory(history_size, history_retention)
+        self.still_time_history = TimeHistory(history_size, history_retention)
+
+        # Track ids are assigned in increasing order, the largest id seen
+        # is the number of visitors
+        self.total_visitors = 0
 
+        # Guards the counters when the dashboard is rendered on another thread
+        self.lock = threading.Lock()
 
     def update(
             self,
-            tracked_objects: Sequence[TrackedObject]
+            tracked_objects: Sequence["TrackedObject"]
     ):
 
+        with self.lock:
+            self._update(tracked_objects)
+
+    def _update(self, tracked_objects):
+
         current_time = time()
-        list_id = []
+        current_object_time = dict()
         # update time list
         for obj in tracked_objects:
-            list_id.append(obj.id)
-            if obj.id in self.current_object_time:
-                self.current_object_time[obj.id].add_time(current_time, obj.estimate)
+            object_time = self.current_object_time.pop(obj.id, None)
+            if object_time is None:
+                object_time = ObjectTime(obj.id, obj.estimate,current_time, self.stand_time_hit)
+                self.total_visitors = max(self.total_visitors, obj.id)
             else:
-                self.current_object_time[obj.id] = ObjectTime(obj.id, obj.estimate,current_time, self.stand_time_hit)
-                
-            # add/update object in current object time to history    
-            self.history_object_time[obj.id] = self.current_object_time[obj.id]
-
-        # keep only new or update objects and delete the rest from the current_object_time.
-        # Note: A copy of all objects already saved in the history.
-        self.current_object_time = {key: self.current_object_time[key] 
-            for key in self.current_object_time if key in list_id}
-            
-        # set current time as previous time for the next update
+                object_time.add_time(current_time, obj.estimate)
+            current_object_time[obj.id] = object_time
+
+        # objects left in the dictionary are no longer in frame, move their
+        # times to the history
+        for object_time in self.current_object_time.values():
+            self.total_time_history.append(object_time.total_time, current_time)
+            for still_time in object_time.still_time_history:
+                self.still_time_history.append(still_time, current_time)
+
+        self.current_object_time = current_object_time
+        self.total_time_history.expire(current_time)
+        self.still_time_history.expire(current_time)
        
     def draw_time(self, frame, text_size, text_thickness):
         """
@@ -99,13 +240,13 @@ class ObjectTimeCount:
                 text = "{}/{}".format(text_still, text)
             
             text_color = (0,0,0)
-            text_color = Palette.choose_color(key)
+            text_color = palette.choose_color(key)
 
             box = self.current_object_time[key].prev_bbox
 
-            coordinates = np.mean(np.array(box), axis=0)
+            coordinates = (box[0] + box[1]) / 2
 
-            (text_w, text_h),_ = cv2.getTextSize(str(text), cv2.FONT_HERSHEY_SIMPLEX, text_size, text_thickness)
+            (text_w, text_h),_ = text_cache.get_text_size(str(text), cv2.FONT_HERSHEY_SIMPLEX, text_size, text_thickness)
 
             coordinates[0] = int(coordinates[0] - text_w/2)
 
@@ -118,14 +259,16 @@ class ObjectTimeCount:
             coordinates[1] = int(box[0,1])
 
 
-            cv2.putText(
+            # timers change constantly, build them from the glyph atlas
+            text_cache.put_text(
             frame,
             text,
             (coordinates.astype(int)),
             cv2.FONT_HERSHEY_SIMPLEX,
             text_size,
             text_color,
-            text_thickness
+            text_thickness,
+            glyphs=True
             )
            
 
@@ -146,26 +289,27 @@ class ObjectTimeCount:
 
         return text
 
-    def get_time_history(self):
-        
-        total_time_array = []
-        still_time_array = []
-
-        for key in self.history_object_time:
-            total_time_array.append(self.history_object_time[key].total_time)
-            for elem in self.history_object_time[key].still_time_history:
-                still_time_array.append(elem)
+    def get_time_histograms(self):
+        """
+        Histograms of the total and still times of the objects in the
+        history and of the objects currently in frame.
+        Returns:
+            (counts, edges) of the total times, (counts, edges) of the still times
+        """
+        with self.lock:
+            current = self.current_object_time.values()
+            total_time_hist = self.total_time_history.histogram.get(
+                [obj.total_time for obj in current]
+            )
+            still_time_hist = self.still_time_history.histogram.get(
+                [t for obj in current for t in obj.still_time_history]
+            )
 
-        return total_time_array, still_time_array
+        return total_time_hist, still_time_hist
 
     def get_occupancy(self):
-        current_occupancy = len(self.current_object_time)
-        if self.history_object_time:
-            total_vistors = max(self.history_object_time.keys())
-        else:
-            total_vistors = 0
-
-        return current_occupancy,total_vistors
+        with self.lock:
+            return len(self.current_object_time), self.total_visitors
 
 class ObjectTime:
     """
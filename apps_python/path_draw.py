@@ -27,16 +27,24 @@
 #  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 #  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
-from typing import Callable, Optional, Sequence, Tuple
+from typing import TYPE_CHECKING, Callable, Optional, Sequence, Tuple
 import numpy as np
 import cv2
 import math
-from norfair.tracker import TrackedObject
-from norfair.drawing.color import Palette
+import palette
+
+if TYPE_CHECKING:
+    from norfair.tracker import TrackedObject
 
 
 class PathDraw:
     """
+    Draw the recent path of each tracked object as circles shrinking with age.
+
+    The path points of all tracks are kept in one preallocated ring array
+    with a slot per track. The pixels of each circle size are rasterized
+    once with cv2.circle and the circles of all tracks are written to the
+    frame with a single array assignment.
     """
     
     def __init__(
@@ -45,6 +53,7 @@ class PathDraw:
                 thickness: Optional[int] = 2,
                 radius: Optional[int] = 10,
                 attenuation: float = 0.01,
+                capacity: int = 64,
         ):
         
         self.history_size = history_size
@@ -52,62 +61,135 @@ class PathDraw:
         self.radius = radius
         self.attenuation = attenuation
 
-        self.path_list = dict()
+        # path points of each slot, newest at heads[slot]
+        self.points = np.zeros((capacity, history_size, 2), np.float64)
+        self.heads = np.zeros(capacity, np.intp)
+        self.lengths = np.zeros(capacity, np.intp)
+        self.slots = dict()  # track id -> slot
+        self.free = list(range(capacity - 1, -1, -1))
+        self.colors = dict()  # track id -> color
+
+        # radius of the circle for each position in the path, shrinking
+        # with age, and the pixel offsets of each circle rasterized once
+        self.radii = [math.ceil(self.radius * 0.95**age) for age in range(history_size)]
+        offsets = []
+        for radius in self.radii:
+            center = radius + self.thickness
+            stamp = np.zeros((2 * center + 1, 2 * center + 1), np.uint8)
+            cv2.circle(stamp, (center, center), radius, 1, self.thickness)
+            rows, cols = np.nonzero(stamp)
+            offsets.append(np.column_stack((cols, rows)) - center)
+        self.stamp_counts = np.array([len(o) for o in offsets])
+        self.stamp_starts = np.cumsum(self.stamp_counts) - self.stamp_counts
+        self.stamp_offsets = np.concatenate(offsets)
+        self.stamp_width = None  # frame width of stamp_flat
+        self.stamp_flat = None  # stamp_offsets as offsets in the flat frame
+
+    def grow(self):
+        """
+        Double the number of slots
+        """
+        capacity = len(self.heads)
+        self.points = np.concatenate((self.points, np.zeros_like(self.points)))
+        self.heads = np.concatenate((self.heads, np.zeros_like(self.heads)))
+        self.lengths = np.concatenate((self.lengths, np.zeros_like(self.lengths)))
+        self.free = list(range(2 * capacity - 1, capacity - 1, -1))
 
     def draw(
             self,
             frame,
-            tracked_objects: Sequence[TrackedObject]
+            tracked_objects: Sequence["TrackedObject"]
     )-> np.array:
-        
-        list_id = []
-        # update path list
-        for obj in tracked_objects:
-            list_id.append(obj.id)
-            if obj.id in self.path_list:
-                self.path_list[obj.id].add(obj.estimate)
-            else:
-                self.path_list[obj.id] = PathList(self.history_size, obj.estimate)
-
-        # keep only new or updated objects path and remove the rest.
-        self.path_list = {key: self.path_list[key] 
-            for key in self.path_list if key in list_id}
-        return self.draw_circle(frame)
-
-    def draw_circle(self, frame):
-        for key in self.path_list:
-            radius_factor = 1
-            for point in self.path_list[key].path:
-                color = Palette.choose_color(key)
-                radius = math.ceil(self.radius * radius_factor)
-                cv2.circle(
-                    frame,
-                    tuple(point.astype(int)),
-                    radius=radius,
-                    color=color,
-                    thickness=self.thickness)
-                radius_factor = radius_factor * 0.95
-        return frame
 
-from queue import Queue
-class PathList:
-    """
-    """
-    
-    def __init__(self, size, bbox):
-        self.size = size
-        self.path = [] 
-        self.len = 0
+        if len(tracked_objects) == 0:
+            self.slots.clear()
+            self.colors.clear()
+            self.free = list(range(len(self.heads) - 1, -1, -1))
+            return frame
 
-        self.add(bbox)
+        # release the slots of tracks which are gone
+        ids = [obj.id for obj in tracked_objects]
+        gone = self.slots.keys() - set(ids)
+        for key in gone:
+            self.free.append(self.slots.pop(key))
+            del self.colors[key]
 
-    def add(self, bbox):
-        # calcualte center point
-        center = np.mean(np.array(bbox), axis=0)
-        self.path.insert(0, center)
-        if len(self.path) > self.size:
-            self.path.pop(self.size)
+        # find or assign the slot of each track
+        slots = np.empty(len(ids), np.intp)
+        for i, key in enumerate(ids):
+            slot = self.slots.get(key)
+            if slot is None:
+                if not self.free:
+                    self.grow()
+                slot = self.free.pop()
+                self.slots[key] = slot
+                self.colors[key] = palette.choose_color(key)
+                self.lengths[slot] = 0
+            slots[i] = slot
 
-        
+        # add the centers to the path of each track
+        estimates = np.array([obj.estimate for obj in tracked_objects], np.float64)
+        heads = (self.heads[slots] + 1) % self.history_size
+        self.heads[slots] = heads
+        self.points[slots, heads] = estimates.reshape(-1, 2, 2).mean(axis=1)
+        self.lengths[slots] = np.minimum(self.lengths[slots] + 1, self.history_size)
+
+        # tracks are painted in the order they were first seen
+        return self.draw_circle(
+            frame,
+            list(self.slots.keys()),
+            np.fromiter(self.slots.values(), np.intp, len(self.slots)),
+        )
 
+    def draw_circle(self, frame, ids, slots):
+        height, width = frame.shape[:2]
+        if self.stamp_width != width:
+            self.stamp_width = width
+            self.stamp_flat = (
+                self.stamp_offsets[:, 1] * width + self.stamp_offsets[:, 0]
+            ).astype(np.int32)
 
+        # points of all tracks from the newest to the oldest
+        age = np.arange(self.history_size)
+        order = (self.heads[slots, np.newaxis] - age) % self.history_size
+        centers = self.points[slots[:, np.newaxis], order].astype(np.intp)
+        colors = np.array([self.colors[key] for key in ids], frame.dtype)
+
+        margin = self.radius + self.thickness
+        visible = age < self.lengths[slots, np.newaxis]
+        inside = visible & np.all(centers >= margin, axis=2)
+        inside &= (centers[..., 0] < width - margin) & (centers[..., 1] < height - margin)
+        if not frame.flags.c_contiguous:
+            inside[:] = False
+
+        # Circles are painted track by track from the newest to the oldest,
+        # so later circles cover earlier ones. Stamped circles have their
+        # pixels written in batches, circles crossing the frame border are
+        # drawn with cv2.circle in between, at their place in that order.
+        track, age = np.nonzero(visible)
+        stamped = inside[track, age]
+        counts = np.where(stamped, self.stamp_counts[age], 0)
+        ends = np.cumsum(counts)
+        offsets = np.arange(ends[-1] if len(ends) else 0, dtype=np.int32) + np.repeat(
+            (self.stamp_starts[age] - (ends - counts)).astype(np.int32), counts
+        )
+        base = (centers[track, age, 1] * width + centers[track, age, 0]).astype(np.int32)
+        pixels = np.repeat(base, counts) + self.stamp_flat[offsets]
+        values = np.repeat(colors[track], counts, axis=0)
+        flat = frame.reshape(-1, frame.shape[2]) if frame.flags.c_contiguous else None
+
+        start = 0
+        for i in np.flatnonzero(~stamped):
+            end = ends[i]
+            if end > start:
+                flat[pixels[start:end]] = values[start:end]
+                start = end
+            cv2.circle(
+                frame,
+                tuple(centers[track[i], age[i]].tolist()),
+                radius=self.radii[age[i]],
+                color=self.colors[ids[track[i]]],
+                thickness=self.thickness)
+        if len(pixels) > start:
+            flat[pixels[start:]] = values[start:]
+        return frame
@@ -30,17 +30,10 @@
 
 import cv2
 import numpy as np
-import copy
 import debug
-import norfair
-from norfair import Detection, Tracker
+import text_cache
 from typing import List , Optional, Union
 
-from path_draw import PathDraw
-from heat_map import HeatMap
-from object_time_count import ObjectTimeCount
-from dashboard import Dashboard
-
 np.set_printoptions(threshold=np.inf, linewidth=np.inf)
 
 
@@ -102,17 +95,42 @@ class PostProcess:
         elif flow.model.task_type == "segmentation":
             return PostProcessSegmentation(flow)
 
+    def is_tracking(self):
+        """
+        Check if any object is being tracked. Used by the motion gate to
+        keep inference at the full rate.
+        """
+        return False
+
+    def stop(self):
+        """
+        Stop the threads owned by the post process, if any
+        """
+        pass
+
+    def predict(self, img, results, out=None):
+        """
+        Post process function for frames on which inference was skipped.
+        By default the results of the last inference are drawn again.
+        Args:
+            img: Input frame
+            results: output of the last inference
+            out: optional array to render the output into
+        """
+        return self(img, results, out=out)
+
 
 class PostProcessClassification(PostProcess):
     def __init__(self, flow):
         super().__init__(flow)
 
-    def __call__(self, img, results):
+    def __call__(self, img, results, out=None):
         """
         Post process function for classification
         Args:
             img: Input frame
             results: output of inference
+            out: not used, the output is drawn on img
         """
         results = np.squeeze(results)
         img = self.overlay_topN_classnames(img, results)
@@ -142,7 +160,7 @@ class PostProcessClassification(PostProcess):
         title_text = "Recognized Classes (Top %d):" % N
         font = cv2.FONT_HERSHEY_SIMPLEX
 
-        text_size, _ = cv2.getTextSize(title_text, font, font_size, 2)
+        text_size, _ = text_cache.get_text_size(title_text, font, font_size, 2)
 
         bg_top_left = (0, (2 * row_size) - text_size[1] - 5)
         bg_bottom_right = (text_size[0] + 10, (2 * row_size) + 3 + 5)
@@ -154,7 +172,7 @@ class PostProcessClassification(PostProcess):
                       (5, 11, 120),
                       -1)
 
-        cv2.putText(
+        text_cache.put_text(
             frame,
             title_text,
             font_coord,
@@ -167,7 +185,7 @@ class PostProcessClassification(PostProcess):
         for idx in topN_classes:
             class_name = self.model.classnames.get(idx + self.model.label_offset)
 
-            text_size, _ = cv2.getTextSize(class_name, font, font_size, 2)
+            text_size, _ = text_cache.get_text_size(class_name, font, font_size, 2)
 
             bg_top_left = (0, (row_size * row) - text_size[1] - 5)
             bg_bottom_right = (text_size[0] + 10, (row_size * row) + 3 + 5)
@@ -178,7 +196,7 @@ class PostProcessClassification(PostProcess):
                          bg_bottom_right,
                          (5, 11, 120),
                          -1)
-            cv2.putText(
+            text_cache.put_text(
                 frame,
                 class_name,
                 font_coord,
@@ -194,46 +212,114 @@ class PostProcessClassification(PostProcess):
         return frame
 
 
-class PostProcessDetection(PostProcess):
-    def __init__(self, flow):
-        super().__init__(flow)
+class DetectionDecoder:
+    """
+    Decoder plan which gathers the outputs of a detection model into rows of
+    [X1 Y1 X2 Y2 class score]. The column map (shuffle_indices, ignore_index
+    and formatter) is resolved once from the ModelConfig and the output
+    shapes, after which every frame only copies the six needed columns into
+    a preallocated buffer and scales the boxes in place.
+    """
 
-    def __call__(self, img, results):
+    NUM_COLUMNS = 6
+
+    def __init__(self, model, normalize=True):
         """
-        Post process function for detection
         Args:
-            img: Input frame
-            results: output of inference
+            model: ModelConfig of the detection model
+            normalize: Scale the boxes to [0, 1] if the model outputs are in
+                       model input co-ordinates
         """
-        for i, r in enumerate(results):
-            r = np.squeeze(r)
-            if r.ndim == 1:
-                r = np.expand_dims(r, 1)
-            results[i] = r
+        self.model = model
+        self.shapes = None
+        self.columns = None
+        self.views = None
+        self.buffer = None
+        self.scale = None
+        if normalize and not model.normalized_detections:
+            resize_w, resize_h = model.resize[0], model.resize[1]
+            self.scale = 1 / np.array(
+                [resize_w, resize_h, resize_w, resize_h], np.float32
+            )
 
-        if self.model.shuffle_indices:
-            results_reordered = []
-            for i in self.model.shuffle_indices:
-                results_reordered.append(results[i])
-            results = results_reordered
+    def compile(self, results):
+        """
+        Resolve the source output and column of every decoded column
+        Args:
+            results: output of inference used to get the output shapes
+        """
+        squeezed = [np.squeeze(r) for r in results]
 
-        if results[-1].ndim < 2:
-            results = results[:-1]
+        order = list(range(len(squeezed)))
+        if self.model.shuffle_indices:
+            order = list(self.model.shuffle_indices)
+        if squeezed[order[-1]].ndim < 1:
+            order = order[:-1]
 
-        bbox = np.concatenate(results, axis=-1)
+        # Columns of the concatenated output as (output index, column)
+        concat = []
+        for i in order:
+            width = 1 if squeezed[i].ndim == 1 else squeezed[i].shape[-1]
+            concat.extend((i, c) for c in range(width))
 
+        mapping = list(concat)
         if self.model.formatter:
-            if self.model.ignore_index == None:
-                bbox_copy = copy.deepcopy(bbox)
-            else:
-                bbox_copy = copy.deepcopy(np.delete(bbox, self.model.ignore_index, 1))
-            bbox[..., self.model.formatter["dst_indices"]] = bbox_copy[
-                ..., self.model.formatter["src_indices"]
-            ]
+            ignore = self.model.ignore_index
+            if ignore == None:
+                ignore = []
+            elif np.ndim(ignore) == 0:
+                ignore = [ignore]
+            ignore = set(i % len(concat) for i in ignore)
+            kept = [col for k, col in enumerate(concat) if k not in ignore]
+            for dst, src in zip(
+                self.model.formatter["dst_indices"],
+                self.model.formatter["src_indices"],
+            ):
+                mapping[dst] = kept[src]
+
+        self.columns = mapping[: DetectionDecoder.NUM_COLUMNS]
+        num_rows = squeezed[order[0]].shape[0]
+        self.views = {
+            i: (num_rows, 1 if squeezed[i].ndim == 1 else squeezed[i].shape[-1])
+            for i, _ in self.columns
+        }
+        self.buffer = np.zeros((num_rows, DetectionDecoder.NUM_COLUMNS), np.float32)
+        self.shapes = tuple(r.shape for r in results)
+
+    def __call__(self, results):
+        """
+        Decode the outputs of one frame. The returned array is reused by the
+        next call.
+        Args:
+            results: output of inference
+        """
+        if tuple(r.shape for r in results) != self.shapes:
+            self.compile(results)
 
-        if not self.model.normalized_detections:
-            bbox[..., (0, 2)] /= self.model.resize[0]
-            bbox[..., (1, 3)] /= self.model.resize[1]
+        outputs = {i: results[i].reshape(shape) for i, shape in self.views.items()}
+        for dst, (i, col) in enumerate(self.columns):
+            self.buffer[:, dst] = outputs[i][:, col]
+
+        if self.scale is not None:
+            self.buffer[:, :4] *= self.scale
+
+        return self.buffer
+
+
+class PostProcessDetection(PostProcess):
+    def __init__(self, flow):
+        super().__init__(flow)
+        self.decoder = DetectionDecoder(self.model)
+
+    def __call__(self, img, results, out=None):
+        """
+        Post process function for detection
+        Args:
+            img: Input frame
+            results: output of inference
+            out: not used, the output is drawn on img
+        """
+        bbox = self.decoder(results)
 
         for b in bbox:
             if b[5] > self.model.viz_threshold:
@@ -291,12 +377,13 @@ class PostProcessDetection(PostProcess):
 
 
 class PostProcessSegmentation(PostProcess):
-    def __call__(self, img, results):
+    def __call__(self, img, results, out=None):
         """
         Post process function for segmentation
         Args:
             img: Input frame
             results: output of inference
+            out: not used, the output is drawn on img
         """
         img = self.blend_segmentation_mask(img, results[0])
 
@@ -358,6 +445,16 @@ class PostProcessTracking(PostProcess):
     def __init__(self, flow):
         super().__init__(flow)
 
+        # The tracking and analytics stack is only imported by the flows
+        # which use it, norfair and scipy only with the norfair tracker
+        from array_tracker import ArrayTracker
+        from path_draw import PathDraw
+        from heat_map import HeatMap
+        from heat_map_pyramid import HeatMapPyramid
+        from object_time_count import ObjectTimeCount
+        from dashboard import Dashboard
+        from analytics_worker import AnalyticsWorker
+
         DISTANCE_THRESHOLD_BBOX: float = 1
         DISTANCE_FUNCTION = "iou"
         INITIALIZATION_DELAY = 4
@@ -368,99 +465,193 @@ class PostProcessTracking(PostProcess):
 
         PATH_HISTORY_SIZE = 10
 
+        # Hit counters count frames, so keep the same tolerance in detections
+        # when inference runs only every detect_interval frames
+        detect_interval = self.model.inference.detect_interval
+        INITIALIZATION_DELAY *= detect_interval
+        HIT_COUNTER_MAX *= detect_interval
+
+        # frames since the last detections, passed to the tracker as period
+        self.period = 1
+
         # initilize tracker 
-        self.tracker = Tracker(initialization_delay=INITIALIZATION_DELAY,
-        distance_function=DISTANCE_FUNCTION,
-        distance_threshold=DISTANCE_THRESHOLD_BBOX,
-        hit_counter_max=HIT_COUNTER_MAX
-        )
+        self.array_tracker = self.model.tracking.tracker == "array"
+        if self.array_tracker:
+            self.tracker = ArrayTracker(initialization_delay=INITIALIZATION_DELAY,
+            distance_threshold=DISTANCE_THRESHOLD_BBOX,
+            hit_counter_max=HIT_COUNTER_MAX,
+            matching=self.model.tracking.matching
+            )
+        else:
+            from norfair import Tracker
+
+            self.tracker = Tracker(initialization_delay=INITIALIZATION_DELAY,
+            distance_function=DISTANCE_FUNCTION,
+            distance_threshold=DISTANCE_THRESHOLD_BBOX,
+            hit_counter_max=HIT_COUNTER_MAX
+            )
 
         self.pathd = PathDraw(history_size=PATH_HISTORY_SIZE)
 
         frame_shape = (self.flow.sensor_height, self.flow.sensor_width)
-        self.heatMap = HeatMap(frame_shape,30)
+        self.heatMap = HeatMap(
+            frame_shape,
+            30,
+            cell_size=self.model.tracking.heatmap_cell_size,
+            mode=self.model.tracking.heatmap_mode,
+            half_life=self.model.tracking.heatmap_half_life,
+            window=self.model.tracking.heatmap_window,
+            buckets=self.model.tracking.heatmap_buckets,
+            report=self.flow.report,
+        )
+        if self.model.tracking.heatmap_pyramid:
+            self.heatMap.pyramid = HeatMapPyramid(
+                frame_shape,
+                cell_size=self.model.tracking.heatmap_pyramid_cell_size,
+                span=self.model.tracking.heatmap_pyramid_span,
+                keep=self.model.tracking.heatmap_pyramid_keep,
+            )
+            self.heatMap.pyramid_range = self.model.tracking.heatmap_pyramid_range
+        if self.model.tracking.heatmap_file:
+            self.heatMap.attach(
+                self.model.tracking.heatmap_file,
+                self.model.tracking.heatmap_flush_interval,
+            )
 
-        self.timeCount = ObjectTimeCount(5)
+        self.timeCount = ObjectTimeCount(
+            5,
+            history_size=self.model.tracking.history_size,
+            history_retention=self.model.tracking.history_retention,
+        )
 
         self.dashBoard = Dashboard(5, self.heatMap, self.timeCount)
 
-    def __call__(self, img, results):
+        self.analytics = None
+        if self.model.tracking.analytics_worker:
+            self.analytics = AnalyticsWorker(self.dashBoard, self.heatMap, self.timeCount)
+
+        # boxes are scaled to pixels after filtering in decode_detections
+        self.decoder = DetectionDecoder(self.model, normalize=False)
+
+    def __call__(self, img, results, out=None):
         """
         Post process function for people tracking
         Args:
             img: Input frame
             results: output of inference
+            out: optional array the dashboard and frame are composed into
         """
-        for i, r in enumerate(results):
-            r = np.squeeze(r)
-            if r.ndim == 1:
-                r = np.expand_dims(r, 1)
-            results[i] = r
-
-        if self.model.shuffle_indices:
-            results_reordered = []
-            for i in self.model.shuffle_indices:
-                results_reordered.append(results[i])
-            results = results_reordered
-
-        if results[-1].ndim < 2:
-            results = results[:-1]
-
-        bbox = np.concatenate(results, axis=-1)
-
-        if self.model.formatter:
-            if self.model.ignore_index == None:
-                bbox_copy = copy.deepcopy(bbox)
-            else:
-                bbox_copy = copy.deepcopy(np.delete(bbox, self.model.ignore_index, 1))
-            bbox[..., self.model.formatter["dst_indices"]] = bbox_copy[
-                ..., self.model.formatter["src_indices"]
-            ]
+        bbox = self.decoder(results)
 
         ####################################################################
         # OBJECT TRACKING 
         ####################################################################
-        if not self.model.normalized_detections:
-            bbox[..., (0, 2)] /= self.model.resize[0]
-            bbox[..., (1, 3)] /= self.model.resize[1]
-        
-        bbox[..., (0, 2)] *= img.shape[1]
-        bbox[..., (1, 3)] *= img.shape[0]
-
-        
         # change the detected object to a format understood by the tracker
-        detections = self.yolo_detections_to_norfair_detections(bbox)
+        boxes, scores = self.decode_detections(bbox, img.shape[1], img.shape[0])
+        if self.array_tracker:
+            # the array tracker takes the decoded boxes as they are
+            tracked_objects = self.tracker.update(boxes, period=self.period)
+        else:
+            detections = self.yolo_detections_to_norfair_detections(boxes, scores)
+            tracked_objects = self.tracker.update(detections=detections, period=self.period)
+        self.period = 1
+
+        return self.update_analytics(img, tracked_objects, boxes, out)
+
+    def predict(self, img, results=None, out=None):
+        """
+        Post process function for frames on which inference was skipped.
+        The tracker advances its motion model and the overlays and analytics
+        are updated from the predicted positions.
+        Args:
+            img: Input frame
+            results: output of the last inference, not used
+            out: optional array the dashboard and frame are composed into
+        """
+        self.period += 1
+        if self.array_tracker:
+            tracked_objects = self.tracker.update()
+        else:
+            tracked_objects = self.tracker.update(detections=None)
+
+        estimates = np.array([obj.estimate for obj in tracked_objects]).reshape(-1, 2, 2)
+
+        return self.update_analytics(img, tracked_objects, estimates, out)
+
+    def is_tracking(self):
+        """
+        Check if the tracker holds any track, including tracks which are
+        not initialized yet.
+        """
+        if self.array_tracker:
+            return self.tracker.count > 0
+        return len(self.tracker.tracked_objects) > 0
 
-        tracked_objects = self.tracker.update(detections=detections)
+    def stop(self):
+        """
+        Stop the analytics worker
+        """
+        if self.analytics:
+            self.analytics.stop()
 
+    def update_analytics(self, img, tracked_objects, boxes, out=None):
+        """
+        Update time counting, heatmap and dashboard and draw the overlays
+        Args:
+            img: Input frame
+            tracked_objects: active tracked objects
+            boxes: (M, 2, 2) detected or predicted boxes added to the heatmap
+            out: optional array the dashboard and frame are composed into
+        """
         self.timeCount.update(tracked_objects)
-        
-        self.heatMap.update(detections)
 
-        db = self.dashBoard.update_dashboard(img)
+        if self.analytics:
+            # heatmap and dashboard are rendered by the worker
+            dropped = self.analytics.submit(boxes, img)
+            if dropped:
+                self.flow.report.report_count("analytics dropped", count=dropped)
+        else:
+            self.heatMap.update(boxes)
+            db = self.dashBoard.update_dashboard(img)
 
         img = self.pathd.draw(img, tracked_objects)
         self.timeCount.draw_time(img, text_size = 1.5, text_thickness = 3)
 
-        return self.dashBoard.add_dashboard(img)
-    
-    def yolo_detections_to_norfair_detections(self, results_bbox) -> List[Detection]:
-        """convert detections_as_xywh to norfair detections"""
-        norfair_detections: List[Detection] = []
-        for b in results_bbox:
-            if b[5] > self.model.viz_threshold and int(b[4]) == 0:
-                bbox = np.array(
-                    [
-                        [b[0].item(), b[1].item()],
-                        [b[2].item(), b[3].item()],
-                    ]
-                )
-                scores = np.array(
-                    [b[5], b[5]]
-                )
-                norfair_detections.append(
-                    Detection(
-                        points=bbox, scores=scores, label=int(b[4])
-                    )
-                )
-        return norfair_detections
\ No newline at end of file
+        if self.analytics:
+            return self.dashBoard.add_dashboard(img, self.analytics.dashboard, out=out)
+        return self.dashBoard.add_dashboard(img, out=out)
+
+    def decode_detections(self, results_bbox, width, height):
+        """
+        Filter the raw detections by score and class and scale the kept
+        boxes to pixel co-ordinates, all in a single pass over the matrix.
+        Args:
+            results_bbox: (N, 6) detections as [X1 Y1 X2 Y2 class score]
+            width: width of the frame in pixels
+            height: height of the frame in pixels
+        Returns:
+            boxes: (M, 2, 2) boxes as [[X1 Y1] [X2 Y2]] in pixels
+            scores: (M,) score of each kept box
+        """
+        keep = (results_bbox[:, 5] > self.model.viz_threshold) & (
+            results_bbox[:, 4].astype(int) == 0
+        )
+        kept = results_bbox[keep]
+
+        scale = np.array([width, height, width, height], np.float32)
+        if not self.model.normalized_detections:
+            resize_w, resize_h = self.model.resize[0], self.model.resize[1]
+            scale /= np.array([resize_w, resize_h, resize_w, resize_h], np.float32)
+
+        boxes = (kept[:, :4] * scale).reshape(-1, 2, 2)
+        return boxes, kept[:, 5]
+
+    def yolo_detections_to_norfair_detections(self, boxes, scores) -> "List[norfair.Detection]":
+        """convert decoded boxes and scores to norfair detections"""
+        from norfair import Detection
+
+        scores = np.repeat(scores[:, np.newaxis], 2, axis=1)
+        return [
+            Detection(points=points, scores=score, label=0)
+            for points, score in zip(boxes, scores)
+        ]
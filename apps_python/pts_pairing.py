@@ -0,0 +1,162 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Gst.CLOCK_TIME_NONE, buffers without a timestamp
+CLOCK_TIME_NONE = 2**64 - 1
+
+
+class PtsPairer:
+    """
+    Pair the pre-processed tensors with the sensor frames they were made
+    from. Both appsinks drop buffers under load, so pulling one sample from
+    each does not always give the same frame. Samples are matched by the
+    buffer PTS instead: the older sample of a mismatched pair is dropped
+    and the next one is pulled from its stream.
+
+    A stream looping back to the start restarts its timestamps, so each
+    stream counts these discontinuities and timestamps are compared within
+    the same segment. If no match is found within window drops, the current
+    samples are paired anyway so that a stream with unexpected timestamps
+    cannot stall the pipeline. The segment counters are aligned at that
+    point, in case a discontinuity was only seen on one stream.
+    """
+
+    def __init__(self, pull_tensor, pull_frame, tolerance, window=4, report=None):
+        """
+        Args:
+            pull_tensor: function returning a tensor FrameHandle or None at
+                the end
+            pull_frame: function returning a frame FrameHandle or None at
+                the end
+            tolerance: maximum PTS difference of a pair in nanoseconds
+            window: maximum samples dropped looking for a match
+            report: utils.Report to count the dropped samples
+        """
+        self.pull_tensor = pull_tensor
+        self.pull_frame = pull_frame
+        self.tolerance = tolerance
+        self.window = window
+        self.report = report
+        # held sample, segment and last PTS of each stream
+        self.tensor = None
+        self.frame = None
+        self.segments = [0, 0]
+        self.last_pts = [None, None]
+
+    def pull(self, stream):
+        """
+        Pull the next sample of a stream
+        Args:
+            stream: 0 for tensors, 1 for frames
+        Returns:
+            (handle, segment, pts) or None at the end of the stream
+        """
+        handle = self.pull_tensor() if stream == 0 else self.pull_frame()
+        if handle is None:
+            return None
+        pts = handle.pts
+        last = self.last_pts[stream]
+        if pts != CLOCK_TIME_NONE:
+            if last is not None and pts + self.tolerance < last:
+                # the stream looped back
+                self.segments[stream] += 1
+            self.last_pts[stream] = pts
+        return handle, self.segments[stream], pts
+
+    def count(self, tag):
+        """
+        Count a pairing event in the report
+        """
+        if self.report:
+            self.report.report_count(tag)
+
+    def release(self):
+        """
+        Release the samples held while looking for a match
+        """
+        for held in (self.tensor, self.frame):
+            if held is not None:
+                held[0].release()
+        self.tensor = None
+        self.frame = None
+
+    def __call__(self):
+        """
+        Get the next matching tensor and frame. Unmatched samples are
+        released.
+        Returns:
+            (tensor, frame) handles or None at the end of either stream
+        """
+        drops = 0
+        while True:
+            if self.tensor is None:
+                self.tensor = self.pull(0)
+                if self.tensor is None:
+                    self.release()
+                    return None
+            if self.frame is None:
+                self.frame = self.pull(1)
+                if self.frame is None:
+                    self.release()
+                    return None
+
+            tensor, t_segment, t_pts = self.tensor
+            frame, f_segment, f_pts = self.frame
+
+            if t_pts == CLOCK_TIME_NONE or f_pts == CLOCK_TIME_NONE:
+                break
+
+            if t_segment == f_segment and abs(t_pts - f_pts) <= self.tolerance:
+                break
+
+            if drops >= self.window:
+                # no match in the window, pair the current samples
+                if t_segment != f_segment:
+                    # a discontinuity seen on one stream only, the segments
+                    # would never match again
+                    self.segments = [max(self.segments)] * 2
+                self.count("pts resync")
+                break
+
+            if (t_segment, t_pts) < (f_segment, f_pts):
+                # the frame of this tensor was dropped
+                tensor.release()
+                self.tensor = None
+                self.count("tensor unmatched")
+            else:
+                # the tensor of this frame was dropped
+                frame.release()
+                self.frame = None
+                self.count("frame unmatched")
+            drops += 1
+
+        self.tensor = None
+        self.frame = None
+        return tensor, frame
@@ -0,0 +1,146 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Startup time profile of the application.
+
+Once enabled, every module imported for the first time from the main
+thread is timed, both including and excluding the modules it imports in
+turn, and the phases of EdgeAIDemo.__init__ wrapped in a phase block are
+timed. report() prints both tables.
+"""
+
+import builtins
+import sys
+import threading
+from time import perf_counter
+
+enabled = False
+start_time = None
+imports = []
+phases = []
+
+_import = builtins.__import__
+_stack = []
+_main_thread = None
+
+
+def enable():
+    """
+    Start timing imports and phases. Call it before the heavy imports.
+    """
+    global enabled, start_time, _main_thread
+    if enabled:
+        return
+    enabled = True
+    start_time = perf_counter()
+    _main_thread = threading.get_ident()
+    builtins.__import__ = _timed_import
+
+
+def disable():
+    """
+    Stop timing imports. Recorded times are kept for report().
+    """
+    global enabled
+    enabled = False
+    builtins.__import__ = _import
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """
+    Replacement of builtins.__import__ recording the time spent in imports
+    of modules which are not loaded yet.
+    """
+    if threading.get_ident() != _main_thread:
+        return _import(name, globals, locals, fromlist, level)
+
+    loaded = level == 0 and name in sys.modules
+    start = perf_counter()
+    _stack.append(0.0)
+    try:
+        return _import(name, globals, locals, fromlist, level)
+    finally:
+        children = _stack.pop()
+        elapsed = perf_counter() - start
+        if _stack:
+            _stack[-1] += elapsed
+        if not loaded:
+            imports.append(("." * level + name, elapsed, elapsed - children, len(_stack)))
+
+
+class phase:
+    """
+    Context manager timing a named startup phase. It does nothing unless
+    the profile is enabled.
+
+        with startup_profile.phase("gst pipeline"):
+            ...
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if enabled:
+            self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            phases.append((self.name, perf_counter() - self.start))
+        return False
+
+
+def report(top=25, threshold=0.001):
+    """
+    Print the slowest imports and the time of each phase.
+    Args:
+        top: maximum number of imports printed
+        threshold: imports faster than this many seconds are not printed
+    """
+    if start_time is None:
+        return
+    total = perf_counter() - start_time
+
+    print("==========[STARTUP PROFILE]==========\n")
+    print("%-10s %-10s %s" % ("total ms", "self ms", "import"))
+    slowest = sorted(imports, key=lambda i: i[1], reverse=True)
+    for name, cumulative, own, depth in slowest[:top]:
+        if cumulative < threshold:
+            break
+        print("%10.1f %10.1f %s%s" % (cumulative * 1000, own * 1000, "  " * depth, name))
+
+    print("\n%-10s %s" % ("ms", "phase (includes the imports done in it)"))
+    for name, elapsed in phases:
+        print("%10.1f %s" % (elapsed * 1000, name))
+
+    print("\n%10.1f total since the profile was enabled\n" % (total * 1000))
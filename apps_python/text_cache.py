@@ -0,0 +1,235 @@
+#  Copyright (C) 2021 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from collections import OrderedDict
+import threading
+
+import numpy as np
+import cv2
+
+
+class TextSprite:
+    """
+    Rendered text with the offset of its top left corner from the text origin
+    """
+
+    __slots__ = ("alpha", "image", "mask", "weights", "offset")
+
+    def __init__(self, alpha, color, offset):
+        """
+        Args:
+            alpha: (h, w) uint8 coverage of the text
+            color: text color
+            offset: (x, y) of the top left corner relative to the text origin
+        """
+        self.alpha = alpha
+        self.offset = offset
+        self.image = np.empty(alpha.shape + (len(color),), np.uint8)
+        self.image[:] = color
+        self.mask = (alpha > 0).astype(np.uint8)
+        # anti-aliased text is blended, binary text is copied
+        if np.all(alpha[alpha > 0] == 255):
+            self.weights = None
+        else:
+            weight = alpha.astype(np.float32) / 255
+            self.weights = (1 - weight, weight)
+
+
+class TextCache:
+    """
+    Cache of rendered text. Text is rasterized once with cv2.putText per
+    string, font, scale, thickness and color and then composited with a
+    masked copy. Strings which change constantly, like timers, are built
+    from a glyph atlas of single characters instead of being rasterized.
+    """
+
+    def __init__(self, size=1024):
+        """
+        Args:
+            size: maximum number of cached sprites, least recently used
+                  sprites are dropped first
+        """
+        self.size = size
+        self.sprites = OrderedDict()
+        self.text_sizes = dict()
+        self.glyphs = dict()  # (char, font, scale, thickness) -> (alpha, offset, advance)
+        self.lock = threading.Lock()
+
+    def get_text_size(self, text, font, scale, thickness):
+        """
+        Same as cv2.getTextSize, cached
+        """
+        key = (text, font, scale, thickness)
+        size = self.text_sizes.get(key)
+        if size is None:
+            size = cv2.getTextSize(text, font, scale, thickness)
+            with self.lock:
+                if len(self.text_sizes) >= self.size:
+                    self.text_sizes.clear()
+                self.text_sizes[key] = size
+        return size
+
+    def rasterize(self, text, font, scale, thickness):
+        """
+        Rasterize text and crop it to its pixels
+        Returns:
+            alpha, offset of the top left corner from the text origin
+        """
+        (text_w, text_h), baseline = cv2.getTextSize(text, font, scale, thickness)
+        # strokes may reach beyond the box returned by getTextSize
+        pad = 2 * thickness + int(10 * scale) + 2
+        canvas = np.zeros((text_h + baseline + 2 * pad, text_w + 2 * pad), np.uint8)
+        cv2.putText(canvas, text, (pad, pad + text_h), font, scale, 255, thickness)
+
+        rows = np.flatnonzero(canvas.any(axis=1))
+        cols = np.flatnonzero(canvas.any(axis=0))
+        if len(rows) == 0:
+            return None, (0, 0)
+        alpha = canvas[rows[0] : rows[-1] + 1, cols[0] : cols[-1] + 1]
+        return alpha, (cols[0] - pad, rows[0] - pad - text_h)
+
+    def glyph(self, char, font, scale, thickness):
+        """
+        Glyph of a single character from the atlas
+        Returns:
+            alpha, offset, horizontal advance in pixels
+        """
+        key = (char, font, scale, thickness)
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            alpha, offset = self.rasterize(char, font, scale, thickness)
+            advance = (
+                cv2.getTextSize(char * 2, font, scale, thickness)[0][0]
+                - cv2.getTextSize(char, font, scale, thickness)[0][0]
+            )
+            glyph = (alpha, offset, advance)
+            self.glyphs[key] = glyph
+        return glyph
+
+    def compose(self, text, font, scale, thickness):
+        """
+        Build text from the glyph atlas
+        Returns:
+            alpha, offset of the top left corner from the text origin
+        """
+        placed = []
+        x = 0
+        for char in text:
+            alpha, offset, advance = self.glyph(char, font, scale, thickness)
+            if alpha is not None:
+                placed.append((alpha, x + offset[0], offset[1]))
+            x += advance
+        if not placed:
+            return None, (0, 0)
+
+        x0 = min(gx for _, gx, _ in placed)
+        y0 = min(gy for _, _, gy in placed)
+        x1 = max(gx + a.shape[1] for a, gx, _ in placed)
+        y1 = max(gy + a.shape[0] for a, _, gy in placed)
+        canvas = np.zeros((y1 - y0, x1 - x0), np.uint8)
+        for alpha, gx, gy in placed:
+            region = canvas[gy - y0 : gy - y0 + alpha.shape[0], gx - x0 : gx - x0 + alpha.shape[1]]
+            np.maximum(region, alpha, out=region)
+        return canvas, (x0, y0)
+
+    def sprite(self, text, font, scale, thickness, color, glyphs=False):
+        """
+        Rendered text from the cache
+        """
+        color = tuple(int(c) for c in color)
+        key = (text, font, scale, thickness, color)
+        with self.lock:
+            sprite = self.sprites.get(key, False)
+            if sprite is not False:
+                self.sprites.move_to_end(key)
+                return sprite
+
+        if glyphs:
+            alpha, offset = self.compose(text, font, scale, thickness)
+        else:
+            alpha, offset = self.rasterize(text, font, scale, thickness)
+        sprite = None if alpha is None else TextSprite(alpha, color, offset)
+
+        with self.lock:
+            self.sprites[key] = sprite
+            if len(self.sprites) > self.size:
+                self.sprites.popitem(last=False)
+        return sprite
+
+    def put_text(self, img, text, org, font, scale, color, thickness=1, glyphs=False):
+        """
+        Draw text like cv2.putText
+        Args:
+            img: image to draw on
+            text: string to draw
+            org: bottom left corner of the text
+            font: Hershey font
+            scale: font scale
+            color: text color
+            thickness: stroke thickness
+            glyphs: build the text from the glyph atlas, for constantly
+                    changing strings like timers
+        Returns:
+            img
+        """
+        sprite = self.sprite(text, font, scale, thickness, color, glyphs)
+        if sprite is None:
+            return img
+
+        # clip to the image
+        x = int(org[0]) + sprite.offset[0]
+        y = int(org[1]) + sprite.offset[1]
+        h, w = sprite.alpha.shape
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, img.shape[1]), min(y + h, img.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return img
+        src = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        roi = img[y0:y1, x0:x1]
+
+        if sprite.weights is None:
+            cv2.copyTo(sprite.image[src], sprite.mask[src], roi)
+        else:
+            roi[:] = cv2.blendLinear(
+                roi, sprite.image[src], sprite.weights[0][src], sprite.weights[1][src]
+            )
+        return img
+
+
+# Cache shared by all overlays
+cache = TextCache()
+
+
+def get_text_size(text, font, scale, thickness):
+    return cache.get_text_size(text, font, scale, thickness)
+
+
+def put_text(img, text, org, font, scale, color, thickness=1, glyphs=False):
+    return cache.put_text(img, text, org, font, scale, color, thickness, glyphs)
@@ -89,6 +89,29 @@ def get_cmdline_args(sysv_args):
         "-d", "--dump-dot", help=help_str_dump_dot, action="store_true", default=False
     )
 
+    help_str_profile_startup = (
+        "Print the time taken by each import and initialization phase\n"
+        + "default: Disabled"
+    )
+    parser.add_argument(
+        "--profile-startup",
+        help=help_str_profile_startup,
+        action="store_true",
+        default=False,
+    )
+
+    help_str_no_caps_cache = (
+        "Probe the capabilities of the gst elements instead of loading them\n"
+        + "from the cache saved by a previous run\n"
+        + "default: Disabled"
+    )
+    parser.add_argument(
+        "--no-caps-cache",
+        help=help_str_no_caps_cache,
+        action="store_true",
+        default=False,
+    )
+
     args = parser.parse_args()
     return args
 
@@ -100,6 +123,9 @@ class Report:
         self.frame_count = 0
         self.start_time = 0
         self.flow = flow
+        # Reports are updated from several threads, e.g. the capture and
+        # post-process threads of a pipelined InferPipe
+        self.lock = threading.Lock()
         report_list.append(self)
 
     def report_proctime(self, tag, value):
@@ -112,35 +138,71 @@ class Report:
             tag (string): unique tag to indicate specific processing entity
             value (float): Current measured processing time in microseconds
         """
-        try:
-            data = self._proctime[tag]
-        except KeyError:
-            self._proctime[tag] = (0.0, 0)
-        finally:
-            avg, n = self._proctime[tag]
+        with self.lock:
+            avg, n = self._proctime.get(tag, (0.0, 0))
             avg = (avg * n + value) / (n + 1)
             n = n + 1
             self._proctime[tag] = (avg, n)
-            if print_stdout:
-                print(
-                    "[UTILS] [%s] Time for '%s': %5.2f ms (avg %5.2f ms)"
-                    % (self.flow.model.model_name, tag, value * 1000, avg * 1000)
-                )
+        if print_stdout:
+            print(
+                "[UTILS] [%s] Time for '%s': %5.2f ms (avg %5.2f ms)"
+                % (self.flow.model.model_name, tag, value * 1000, avg * 1000)
+            )
+
+    def report_count(self, tag, unit="frames", count=1):
+        """
+        Used for reporting event counters
+        All the counts with same tag are accumulated and shown with the
+        metrics in the ncurses table
+
+        Args:
+            tag (string): unique tag to indicate specific event
+            unit (string): unit shown next to the count
+            count (int): Number of events to add
+        """
+        with self.lock:
+            total, _, n = self._metrics.get(tag, (0, unit, 0))
+            self._metrics[tag] = (total + count, unit, n + 1)
+        if print_stdout:
+            print(
+                "[UTILS] [%s] Count '%s': %d %s"
+                % (self.flow.model.model_name, tag, total + count, unit)
+            )
+
+    def report_metric(self, tag, value, unit):
+        """
+        Used for reporting the current value of a metric, e.g. a rate
+        The last value is shown with the metrics in the ncurses table
+
+        Args:
+            tag (string): unique tag to indicate specific metric
+            value (float): Current value
+            unit (string): unit shown next to the value
+        """
+        with self.lock:
+            _, _, n = self._metrics.get(tag, (0, unit, 0))
+            self._metrics[tag] = (value, unit, n + 1)
+        if print_stdout:
+            print(
+                "[UTILS] [%s] Metric '%s': %.2f %s"
+                % (self.flow.model.model_name, tag, value, unit)
+            )
 
     def report_frame(self):
         """
         Function to be called at the end of each frame
         used to calculate effective framerate
         """
-        if not self.start_time:
-            self.start_time = time()
-            return
-        self.frame_count += 1
-        total_time = time() - self.start_time
-        avg_time = total_time * 1000 / self.frame_count
-        framerate = self.frame_count / total_time
-        self._metrics["total time"] = (avg_time, "ms", self.frame_count)
-        self._metrics["framerate"] = (framerate, "fps", self.frame_count)
+        with self.lock:
+            if not self.start_time:
+                self.start_time = time()
+                return
+            self.frame_count += 1
+            total_time = time() - self.start_time
+            avg_time = total_time * 1000 / self.frame_count
+            framerate = self.frame_count / total_time
+            self._metrics["total time"] = (avg_time, "ms", self.frame_count)
+            self._metrics["framerate"] = (framerate, "fps", self.frame_count)
         if print_stdout:
             print(
                 "[UTILS] [%s] Metric '%s': %5.2f %s"
@@ -206,8 +268,11 @@ def reporting_loop(demo_title):
             stdscr.addstr(i + 3, last_pos, "|")
             stdscr.addstr(i + 4, 1, "+%s+" % ("-" * (last_pos - 2)))
             i += 5
-            for tag in report._proctime.keys():
-                (avg, n) = report._proctime[tag]
+            with report.lock:
+                proctime = dict(report._proctime)
+                metrics = dict(report._metrics)
+            for tag in proctime.keys():
+                (avg, n) = proctime[tag]
                 avg = avg * 1000
                 stdscr.addstr(i, 1, "| {:<32s} :".format(tag))
                 stdscr.addstr(i, 42, "{:>8.2f} ms".format(avg), curses.A_BOLD)
@@ -215,8 +280,8 @@ def reporting_loop(demo_title):
                 stdscr.addstr(i, last_pos, "|")
                 i = i + 1
             # Throughput
-            for tag in report._metrics.keys():
-                (val, unit, n) = report._metrics[tag]
+            for tag in metrics.keys():
+                (val, unit, n) = metrics[tag]
                 stdscr.addstr(i, 1, "| {:<32s} :".format(tag))
                 stdscr.addstr(i, 42, "{:>8.2f} {}".format(val, unit), curses.A_BOLD)
                 stdscr.addstr(i, 55, " from {:^5d}  samples ".format(n))
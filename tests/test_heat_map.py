@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+
+#  Copyright (C) 2022 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps_python"))
+
+from heat_map import HeatMap
+from heat_map_pyramid import HeatMapPyramid
+
+
+class TestHeatMapDecay(unittest.TestCase):
+    def test_long_idle_gap(self):
+        heatmap = HeatMap((240, 320), mode="decay", half_life=60)
+        origin = heatmap.decay_origin
+        heatmap.update_centers([[100, 100]], now=origin + 1)
+        # more than 1024 half-lives without any detection
+        later = origin + 18 * 3600
+        heatmap.update_centers([[200, 50]], now=later)
+        self.assertEqual(heatmap.decay_origin, later)
+        self.assertEqual(heatmap.impulses[50 // 8, 200 // 8], 1.0)
+        self.assertEqual(heatmap.impulses[100 // 8, 100 // 8], 0.0)
+        self.assertTrue(np.all(np.isfinite(heatmap.impulses)))
+
+    def test_fold_keeps_proportions(self):
+        heatmap = HeatMap((240, 320), mode="decay", half_life=60)
+        origin = heatmap.decay_origin
+        heatmap.update_centers([[100, 100]], now=origin)
+        # weight above DECAY_FOLD, the map is folded
+        heatmap.update_centers([[200, 50]], now=origin + 900)
+        old = heatmap.impulses[100 // 8, 100 // 8]
+        new = heatmap.impulses[50 // 8, 200 // 8]
+        self.assertAlmostEqual(old / new, 0.5**15, delta=1e-9)
+
+
+
+class TestHeatMapTiles(unittest.TestCase):
+    def check_incremental(self, cell_size):
+        rng = np.random.default_rng(cell_size)
+        heatmap = HeatMap((240, 320), cell_size=cell_size)
+        heatmap.accumulate()
+        for _ in range(20):
+            centers = rng.uniform([0, 0], [320, 240], (3, 2))
+            heatmap.update_centers(centers)
+            heatmap.accumulate(np.nonzero(heatmap.dirty_tiles))
+            np.testing.assert_allclose(
+                heatmap.map, heatmap.spread(heatmap.impulses), atol=1e-5
+            )
+
+    def test_incremental_matches_full(self):
+        # at 1 and 2 px cells the kernel is wider than a tile
+        for cell_size in (1, 2, 4, 8):
+            with self.subTest(cell_size=cell_size):
+                self.check_incremental(cell_size)
+
+
+class TestHeatMapPyramid(unittest.TestCase):
+    def setUp(self):
+        # one detection per minute for three days
+        self.pyramid = HeatMapPyramid((240, 320), span=60, keep=128)
+        self.origin = 1700006400
+        self.minutes = 3 * 24 * 60
+        for minute in range(self.minutes):
+            self.pyramid.add(np.array([10]), np.array([10]), self.origin + minute * 60 + 5)
+        self.now = self.origin + self.minutes * 60
+
+    def check(self, start, end):
+        counts, covered = self.pyramid.query(start, end)
+        self.assertLessEqual(covered[0], start)
+        self.assertGreaterEqual(covered[1], end)
+        # each covered minute holds one detection
+        self.assertEqual(counts.sum(), (covered[1] - covered[0]) // 60)
+        return counts.sum()
+
+    def test_recent_range(self):
+        self.assertEqual(self.check(self.now - 3600, self.now), 60)
+
+    def test_dropped_fine_buckets(self):
+        # the base buckets of two days ago were dropped, coarser ones are used
+        start = self.now - 2 * 86400
+        self.assertGreaterEqual(self.check(start, start + 3600), 60)
+        self.assertGreaterEqual(self.check(start, start + 7200), 120)
+
+    def test_random_ranges(self):
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            start = rng.uniform(self.origin, self.now - 60)
+            self.check(start, rng.uniform(start, self.now))
+
+    def test_draw_range(self):
+        heatmap = HeatMap((240, 320), cell_size=8)
+        heatmap.pyramid = HeatMapPyramid((240, 320), span=60)
+        heatmap.pyramid_range = 3600
+        heatmap.update_centers([[100, 100]])
+        image = heatmap.draw(np.zeros((240, 320, 3), np.uint8), (320, 240))
+        self.assertEqual(image.shape, (240, 320, 3))
+        self.assertEqual(heatmap.range_map.impulses.sum(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
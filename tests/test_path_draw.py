@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+
+#  Copyright (C) 2022 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import math
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from norfair.drawing.color import Palette
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps_python"))
+
+from path_draw import PathDraw
+
+
+class ReferencePathDraw:
+    """
+    Path drawing with one cv2.circle call per point: tracks in the order
+    they were first seen, each from the newest point to the oldest
+    """
+
+    def __init__(self, history_size, radius=10, thickness=2):
+        self.history_size = history_size
+        self.radius = radius
+        self.thickness = thickness
+        self.paths = {}
+
+    def draw(self, frame, tracked_objects):
+        ids = [obj.id for obj in tracked_objects]
+        for obj in tracked_objects:
+            path = self.paths.setdefault(obj.id, [])
+            path.insert(0, np.mean(np.array(obj.estimate), axis=0))
+            del path[self.history_size :]
+        self.paths = {key: path for key, path in self.paths.items() if key in ids}
+        for key, path in self.paths.items():
+            for age, point in enumerate(path):
+                cv2.circle(
+                    frame,
+                    tuple(point.astype(int)),
+                    radius=math.ceil(self.radius * 0.95**age),
+                    color=Palette.choose_color(key),
+                    thickness=self.thickness,
+                )
+        return frame
+
+
+class TestPathDraw(unittest.TestCase):
+    def check(self, tracks, frames=40, history_size=30, seed=0):
+        rng = np.random.default_rng(seed)
+        width, height = 320, 240
+        # tracks start around the frame, so that many circles cross its border
+        pos = rng.uniform([-15, -15], [width + 15, height + 15], (tracks, 2))
+        vel = rng.normal(0, 4, (tracks, 2))
+        ids = list(range(tracks))
+        next_id = tracks
+        path_draw = PathDraw(history_size=history_size, capacity=4)
+        reference = ReferencePathDraw(history_size)
+        for frame_index in range(frames):
+            pos += vel
+            for k in range(tracks):
+                if rng.random() < 0.05:
+                    ids[k] = next_id
+                    next_id += 1
+            # the tracker does not keep the tracks in the order they appeared
+            objs = [
+                SimpleNamespace(id=ids[k], estimate=np.array([pos[k] - 7.3, pos[k] + 7.3]))
+                for k in rng.permutation(tracks)
+            ]
+            expected = reference.draw(np.zeros((height, width, 3), np.uint8), objs)
+            frame = path_draw.draw(np.zeros((height, width, 3), np.uint8), objs)
+            np.testing.assert_array_equal(frame, expected, "frame %d" % frame_index)
+
+    def test_few_tracks(self):
+        self.check(5)
+
+    def test_overlapping_tracks(self):
+        self.check(60, history_size=10)
+
+    def test_center_below_integer(self):
+        objs = [SimpleNamespace(id=1, estimate=np.array([[100 - 1e-7] * 2, [100.0] * 2]))]
+        expected = ReferencePathDraw(30).draw(np.zeros((200, 200, 3), np.uint8), objs)
+        frame = PathDraw().draw(np.zeros((200, 200, 3), np.uint8), objs)
+        np.testing.assert_array_equal(frame, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
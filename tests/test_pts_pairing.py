@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+
+#  Copyright (C) 2022 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps_python"))
+
+from pts_pairing import PtsPairer
+
+# frame period in nanoseconds
+PERIOD = 33333333
+
+
+class Handle:
+    def __init__(self, pts):
+        self.pts = pts
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+
+def stream(pts_list):
+    handles = iter([Handle(pts) for pts in pts_list])
+    return lambda: next(handles, None)
+
+
+def pair_all(tensors, frames, window=4):
+    pairer = PtsPairer(stream(tensors), stream(frames), PERIOD / 2, window=window)
+    pairs = []
+    while True:
+        paired = pairer()
+        if paired is None:
+            return pairs
+        pairs.append((paired[0].pts, paired[1].pts))
+
+
+class TestPtsPairer(unittest.TestCase):
+    def test_drops_unmatched(self):
+        tensors = [i * PERIOD for i in range(20) if i not in (3, 4, 11)]
+        frames = [i * PERIOD for i in range(20) if i != 7]
+        pairs = pair_all(tensors, frames)
+        self.assertTrue(all(t == f for t, f in pairs))
+        self.assertEqual(len(pairs), 16)
+
+    def test_loop(self):
+        # both streams loop back after 10 frames, the tensor stream lost
+        # the last frames before the loop
+        tensors = [i * PERIOD for i in list(range(8)) + list(range(10))]
+        frames = [i * PERIOD for i in list(range(10)) + list(range(10))]
+        pairs = pair_all(tensors, frames)
+        self.assertTrue(all(t == f for t, f in pairs))
+        self.assertEqual(len(pairs), 18)
+
+    def test_one_sided_discontinuity(self):
+        # one frame jumps back in time, which only the frame stream counts
+        # as a new segment, the streams have to resync afterwards
+        tensors = [i * PERIOD for i in range(100)]
+        frames = [i * PERIOD for i in range(100)]
+        frames[10] = 0
+        pairs = pair_all(tensors, frames)
+        matched = sum(t == f for t, f in pairs)
+        self.assertGreaterEqual(matched, 80)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+#  Copyright (C) 2022 Texas Instruments Incorporated - http://www.ti.com/
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions
+#  are met:
+#
+#    Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the
+#    distribution.
+#
+#    Neither the name of Texas Instruments Incorporated nor the names of
+#    its contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#  "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#  LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#  A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#  OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#  SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#  LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#  DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#  THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#  (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#  OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "apps_python"))
+
+from object_time_count import TimeHistory
+
+
+class TestTimeHistory(unittest.TestCase):
+    def test_bin_edge(self):
+        # 5 - 1e-8 is below the first bin edge as float64 but rounds to
+        # 5.0 as float32, the precision values are stored with
+        history = TimeHistory(size=3)
+        for i in range(3):
+            history.append(5.0 - 1e-8, i)
+        for i in range(3):
+            history.append(1.0, 3 + i)
+        counts, _ = history.histogram.get()
+        self.assertEqual(counts.min(), 0)
+        self.assertEqual(counts[0], 3)
+        self.assertEqual(counts.sum(), 3)
+
+    def test_value_at_range(self):
+        # 60 is the initial range, it must land in the bin it is removed
+        # from after the range grows
+        history = TimeHistory(size=2)
+        for i, value in enumerate((60.0, 100.0, 1.0, 1.0)):
+            history.append(value, i)
+        counts, _ = history.histogram.get()
+        self.assertEqual(counts.min(), 0)
+        self.assertEqual(counts[0], 2)
+        self.assertEqual(counts.sum(), 2)
+
+    def test_range_edges(self):
+        rng = np.random.default_rng(1)
+        history = TimeHistory(size=20)
+        # values on the bin edges of every range the histogram grows to
+        values = [5.0 * k * 2**e for e in range(6) for k in rng.permutation(13)]
+        for i, value in enumerate(values):
+            history.append(value, i)
+            counts, edges = history.histogram.get()
+            self.assertGreaterEqual(counts.min(), 0)
+            expected, _ = np.histogram(history.get(), bins=edges)
+            np.testing.assert_array_equal(counts, expected)
+
+    def test_matches_np_histogram(self):
+        rng = np.random.default_rng(0)
+        history = TimeHistory(size=50)
+        for i, value in enumerate(rng.uniform(0, 60, 500)):
+            history.append(value, i)
+        counts, edges = history.histogram.get()
+        expected, _ = np.histogram(history.get(), bins=edges)
+        np.testing.assert_array_equal(counts, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()